@@ -3,8 +3,20 @@ import requests
 import pandas as pd 
 import numpy as np
 import io
-import plotly.express as px
 from config import *
+from snapshot import carregar_snapshot, carregar_cubo, ler_metadados
+from classificacao import CATEGORIAS_DEGRADACAO
+from cubo import metricas
+from fonte import FonteSnapshot, FonteBanco
+from consultas import Consultas
+import eventos
+from cache_resultados import CacheLRU, chave_selecao
+from esquema import COLUNAS_DATA
+from tabela import exibir_tabela, LinhasMemoria
+from graficos import exibir_aging
+import atualizador
+import instrumentacao
+import plotly.express as px
 import plotly.graph_objects as go
 
 # Defina o caminho da imagem
@@ -16,57 +28,11 @@ st.set_page_config(
     layout="wide",
 )
 
+instrumentacao.ocultar_pagina_admin()
+
 # Sidebar logo tela
 st.sidebar.image(logo_path, use_column_width=False, width=200)  # Ajusta o uso da largura da coluna
 
-def classify_aging(date):
-    aging_days = (pd.Timestamp.now() - date).days
-    if aging_days == 0:
-        return "24h"
-    elif 1 <= aging_days <= 2:
-        return "1 a 2 dias"
-    elif 3 <= aging_days <= 5:
-        return "3 a 5 dias"
-    elif 6 <= aging_days <= 10:
-        return "6 a 10 dias"
-    elif 11 <= aging_days <= 15:
-        return "11 a 15 dias"
-    elif 16 <= aging_days <= 20:
-        return "16 a 20 dias"
-    elif 21 <= aging_days <= 24:
-        return "21 a 24 dias"
-    elif 25 <= aging_days <= 30:
-        return "25 a 30 dias"
-    elif 31 <= aging_days <= 60:
-        return "31 a 60 dias"
-    elif aging_days > 60:
-        return "> 60 dias"
-    else:
-        return "> 30 dias"
-
-# Função que define o cliente com base no CNPJ
-def define_clientes_df(df_base: pd.DataFrame, clientes: list):
-    df_base['Pagador do frete/Documento'] = df_base['Pagador do frete/Documento'].fillna('').astype(str)
-    df_base['Cliente'] = ''
-    
-    for cliente in clientes:
-        df_base['Cliente'] = np.where(
-            df_base['Pagador do frete/Documento'].str.startswith(cliente['raiz_cnpj']),
-            cliente['nome'], df_base['Cliente']
-        )
-    
-    df_base['Cliente'] = np.where(
-        (
-            df_base['Cliente'].str.startswith('MULTI B2C')
-        ) & (
-            df_base['Frete/N° Referência'].str.contains('B2B', na=False)
-        ), 'MULTI B2B', df_base['Cliente']
-    )
-    
-    df_base['Cliente'] = np.where(df_base['Cliente'] == '', 'OUTROS', df_base['Cliente'])
-    
-    return df_base
-
 # Função que formata números
 def formata_numero(valor, prefixo=''):
     for unidade in ['', 'mil']:
@@ -75,163 +41,159 @@ def formata_numero(valor, prefixo=''):
         valor /= 1000
     return f'{prefixo} {valor:.2f} milhões'
 
+# Datas e valores já vêm tipados do snapshot; a formatação é só na exibição
+formato_colunas = {coluna: st.column_config.DateColumn(format='DD/MM/YYYY') for coluna in COLUNAS_DATA}
+formato_colunas['Nota Fiscal/Valor NF'] = st.column_config.NumberColumn(format='R$ %.2f')
+# A minuta já vem inteira do snapshot; aqui só sai sem separador de milhar
+formato_colunas['N° Minuta'] = st.column_config.NumberColumn(format='%d')
+formato_colunas[eventos.DATA] = st.column_config.DateColumn(format='DD/MM/YYYY')
+
+formato_tentativas = {
+    'Tentativas por frete': st.column_config.NumberColumn(format='%.2f'),
+    'Taxa de sucesso (%)': st.column_config.NumberColumn(format='%.1f'),
+    'Intervalo mediano (dias)': st.column_config.NumberColumn(format='%.1f'),
+}
+
 col1, col2 = st.columns([3, 1])  # A primeira coluna é mais larga
 
 with col1:
     st.title('Degradação')
 
-# Carregar dados em cache
-@st.cache_data
-def load_data():
-    return pd.read_excel('https://rpa.devinectar.com.br/scripts/pre_grade/relatorios_base/agendamento-2023-FULL_2024_10_29_14_52.xlsx')
-
-dados = load_data()
-
-# Definir clientes com base em CNPJ
-dados = define_clientes_df(dados, clientes)
-
-# Tratamento de datas
-date_columns = [
-    'Data do frete', 'Previsão Coleta', 'Data Finalização Performance', 
-    'Data Coleta', 'Data Última Tratativa', 'Data Última Ocorrência', 
-    'Previsão de Entrega'
-]
-for col in date_columns:
-    dados[col] = pd.to_datetime(dados[col], format='%d/%m/%Y')
-
-# Adicionar coluna de aging
-dados['Aging'] = dados['Data Última Ocorrência'].apply(classify_aging)
-
-
-def regional(regional):
-    if regional in regional_GRU:
-        return 'Regional GRU'
-    elif regional in regional_RJO:
-        return 'Regional RJO'
-    elif regional in regional_BHZ:
-        return 'Regional BHZ'
-    elif regional in regional_BR:
-        return "Regional BR"
-
-# Função que define a degradação com base na última ocorrência
-def degradacao(ultima_ocorrencia):
-    if ultima_ocorrencia in ocorrencias_agendamento_em_aberto:
-        return 'Agendamento em Aberto'
-    elif ultima_ocorrencia in aguardando_check_list:
-        return 'Aguardando Check List'
-    elif ultima_ocorrencia in cancelado_finalizado:
-        return 'Cancelado/ Finalizado'
-    elif ultima_ocorrencia in coleta_em_aberto:
-        return 'Coleta em Aberto'
-    elif ultima_ocorrencia in devolucao_em_aberto:
-        return 'Devolução em Aberto'
-    elif ultima_ocorrencia in devolvido:
-        return 'Devolvido'
-    elif ultima_ocorrencia in entrega_em_aberto:
-        return 'Entrega em Aberto'
-    elif ultima_ocorrencia in ocorrencias_insucesso_de_agendamento:
-        return 'Insucesso de Agendamento'
-    elif ultima_ocorrencia in correncia_insucesso_de_devolucao:
-        return 'Insucesso de Devolução'
-    elif ultima_ocorrencia in outros:
-        return 'Outros'
-    elif ultima_ocorrencia in pendecia:
-        return 'Pendência'
-    elif ultima_ocorrencia in ocorrencia_insucesso_de_coleta:
-        return 'Insucesso de Coleta'
-    else:
-        return 'Desconhecido'
-
-# Criação da coluna 'Degradação'
-dados['Degradação'] = dados['Última Ocorrência'].apply(degradacao)
-dados['Regional'] = dados['Agente de Coleta'].apply(regional)
+# Fonte dos dados, montada uma vez por versão do snapshot e compartilhada
+# entre as sessões: o snapshot em memória (com o índice dos filtros e o cubo
+# das métricas, já gravado com a versão) ou, com backend_dados = 'mariadb'
+# ou 'duckdb', consultas SQL
+@st.cache_resource(max_entries=1)
+def load_fonte(versao):
+    if backend_dados == 'mariadb':
+        return FonteBanco()
+    if backend_dados == 'duckdb':
+        return FonteBanco(Consultas(versao))
+    return FonteSnapshot(carregar_snapshot(internas=False, versao=versao), carregar_cubo(versao))
+
+# Histórico de ocorrências por frete (eventos.py), relido quando uma versão
+# nova do snapshot é publicada
+@st.cache_resource(max_entries=1)
+def load_eventos(versao):
+    return eventos.carregar()
+
+# Resultados por seleção da barra lateral, compartilhados entre as sessões
+@st.cache_resource
+def load_cache_resultados():
+    return CacheLRU(limite_cache_resultados_mb * 1024 * 1024)
+
+# A atualização roda em segundo plano e já carrega a fonte de cada versão
+# nova; a página só usa a versão publicada. Cliente, datas, Aging,
+# Degradação e Regional já vêm calculados no snapshot
+atualizador.registrar_aquecimento('degradacao', load_fonte)
+atualizador.iniciar()
+versao = atualizador.versao_publicada()
+fonte = load_fonte(versao)
 
 # Sidebar com filtros
 st.sidebar.title('Filtros')
 
 # Opção para selecionar todos os clientes
-clientes_opcoes = ['Todos os Clientes'] + list(dados['Cliente'].unique())
+clientes_opcoes = ['Todos os Clientes'] + fonte.valores('Cliente')
 embarcador_multi = st.sidebar.selectbox('Cliente', clientes_opcoes)
 
 ano_checkbox = st.sidebar.checkbox('Mostrar todos os anos', value=True)
-ano = '' if ano_checkbox else st.sidebar.selectbox('Ano', [2022, 2023, 2024])
+ano = '' if ano_checkbox else st.sidebar.selectbox('Ano', sorted(fonte.valores('Ano')))
 
 meses = ['Todos os Meses', 'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 
          'Junho', 'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
 mes_selecionado = st.sidebar.selectbox('Mês', meses)
 
 # Filtro de Aging
-aging_opcoes = ['Todos'] + list(dados['Aging'].unique())
+aging_opcoes = ['Todos'] + fonte.valores('Aging')
 aging_selecionado = st.sidebar.selectbox('Faixa Aging', aging_opcoes)
 
-regional_opcoes = ['Todos'] + list(dados['Regional'].unique())
+regional_opcoes = ['Todos'] + fonte.valores('Regional')
 regional_selecionado = st.sidebar.selectbox('Regional',regional_opcoes)
 
 # Filtro de degradação com opção de "Todos"
-degradacao_tipo = ['Todos',  
-                   'Agendamento em Aberto', 
-                   'Aguardando Check List', 
-                   'Cancelado/ Finalizado', 
-                   'Coleta em Aberto',
-                   'Devolução em Aberto',
-                   'Devolvido',
-                   'Entrega em Aberto',
-                   'Insucesso de Agendamento',
-                   'Insucesso de Devolução',
-                   'Outros',
-                   'Pendência',
-                   'Insucesso de Coleta']
+degradacao_tipo = ['Todos'] + CATEGORIAS_DEGRADACAO
 
 tipo_degradacao = st.sidebar.selectbox('Tipo Degradação', degradacao_tipo)
 
+# Busca de um frete em todo o relatório (não depende dos filtros acima)
+termo_busca = ''
+if fonte.campos_busca:
+    st.sidebar.title('Busca')
+    campo_busca = st.sidebar.selectbox('Buscar por', fonte.campos_busca)
+    termo_busca = st.sidebar.text_input('Valor buscado', key='termo_busca').strip()
+
+# Ocorrências do relatório que não estão em nenhuma lista do config.py
+nao_mapeadas = ler_metadados().get('ocorrencias_nao_mapeadas')
+if nao_mapeadas:
+    with st.sidebar.expander(f'{len(nao_mapeadas)} ocorrência(s) sem classificação'):
+        st.dataframe(pd.Series(nao_mapeadas, name='Linhas'))
+
 # Filtrar os dados com base no cliente selecionado, ano (se aplicável) e aging
-dados_filtrados = dados.copy()
+selecao = {}
 
 if embarcador_multi != 'Todos os Clientes':
-    dados_filtrados = dados_filtrados[dados_filtrados['Cliente'] == embarcador_multi]
+    selecao['Cliente'] = embarcador_multi
 
 if mes_selecionado != 'Todos os Meses':
-    mes_numero = meses.index(mes_selecionado)  # Pega o índice que corresponde ao mês
-    dados_filtrados = dados_filtrados[dados_filtrados['Data do frete'].dt.month == mes_numero]
+    selecao['Mês'] = meses.index(mes_selecionado)  # Pega o índice que corresponde ao mês
 
 if ano:
-    dados_filtrados = dados_filtrados[dados_filtrados['Data do frete'].dt.year == ano]
+    selecao['Ano'] = ano
 
 if aging_selecionado != 'Todos':
-    dados_filtrados = dados_filtrados[dados_filtrados['Aging'] == aging_selecionado]
+    selecao['Aging'] = aging_selecionado
 
 # Filtrar os dados com base no tipo de degradação
 if tipo_degradacao != 'Todos':
-    dados_filtrados = dados_filtrados[dados_filtrados['Degradação'] == tipo_degradacao]
-    
-if regional_selecionado != "Todos":
-    dados_filtrados = dados_filtrados[dados_filtrados['Regional'] == regional_selecionado]
+    selecao['Degradação'] = tipo_degradacao
 
-# Visualização no Streamlit
-aba1, aba2, aba3, aba4, aba5, aba6, aba7, aba8, aba9, aba10 = st.tabs([
-    'Em Aberto', 'Insucesso', 'Por Ocorrência', 'Por Agente', 
+if regional_selecionado != "Todos":
+    selecao['Regional'] = regional_selecionado
+
+# Métricas das abas (e, no snapshot, as posições filtradas); sessões com a
+# mesma seleção reaproveitam o resultado e os gráficos
+cache_resultados = load_cache_resultados()
+chave = chave_selecao(versao, selecao)
+resultado = cache_resultados.obter(chave, lambda: fonte.resultado(selecao))
+resumo = resultado['resumo']
+
+# Fretes encontrados pela busca, com a classificação de cada um
+if termo_busca:
+    st.subheader(f'Busca por {campo_busca}: {termo_busca}')
+    exibir_tabela('busca', fonte.buscar(campo_busca, termo_busca), formato_colunas)
+
+# Visualização no Streamlit. Cada aba é uma função e só a aba escolhida é
+# executada (st.tabs executaria todas a cada interação); o que as abas
+# calculam sobre a seleção fica no cache de resultados
+ABAS = [
+    'Em Aberto', 'Insucesso', 'Por Ocorrência', 'Por Agente',
     'Data Coleta', '1ª Minuta', 'Relatório', 'STD', 'Pendência', 'Tentativas'
-])
+]
+aba_selecionada = st.radio('Aba', ABAS, horizontal=True, label_visibility='collapsed', key='aba')
+
+# Cálculos de uma aba guardados junto com a seleção (ordenação das tabelas...)
+def memo_aba(extra, calcular):
+    return cache_resultados.obter(chave + (extra,), calcular)
 
 # Informações da aba "Em Aberto"
-with aba1:
+def aba1():
     
-    dados_aba = dados_filtrados
-    agendamentos = dados_aba[dados_aba['Última Ocorrência'].isin(ocorrencias_agendamento_em_aberto)]
-    coletas = dados_aba[dados_aba['Última Ocorrência'].isin(ocorrencias_coleta_em_aberto)]
-    devolucoes = dados_aba[dados_aba['Última Ocorrência'].isin(ocorrencia_devolucao_em_aberto)]
+    agendamentos = metricas(resumo, ocorrencias_agendamento_em_aberto)
+    coletas = metricas(resumo, ocorrencias_coleta_em_aberto)
+    devolucoes = metricas(resumo, ocorrencia_devolucao_em_aberto)
     
     coluna1, coluna2 = st.columns(2)
 
     with coluna1:
         st.metric(
             'Valor Agendamento em Aberto', 
-            formata_numero(agendamentos['Nota Fiscal/Valor NF'].sum(), 'R$')
+            formata_numero(agendamentos['valor_nf'], 'R$')
         )
     with coluna2:
         st.metric(
             'Agendamento em Aberto', 
-            formata_numero(agendamentos.shape[0])
+            formata_numero(agendamentos['linhas'])
         )
 
     coluna3, coluna4 = st.columns(2)
@@ -239,12 +201,12 @@ with aba1:
     with coluna3:
         st.metric(
             'Valor Coleta em Aberto', 
-            formata_numero(coletas['Nota Fiscal/Valor NF'].sum(), 'R$')
+            formata_numero(coletas['valor_nf'], 'R$')
         )
     with coluna4:
         st.metric(
             'Coleta em Aberto', 
-            formata_numero(coletas.shape[0])
+            formata_numero(coletas['linhas'])
         )
 
     coluna5, coluna6 = st.columns(2)
@@ -252,227 +214,128 @@ with aba1:
     with coluna5:
         st.metric(
             'Valor Devolução em Aberto', 
-            formata_numero(devolucoes['Nota Fiscal/Valor NF'].sum(), 'R$')
+            formata_numero(devolucoes['valor_nf'], 'R$')
         )
     with coluna6:
         st.metric(
             'Devolução em Aberto', 
-            formata_numero(devolucoes.shape[0])
+            formata_numero(devolucoes['linhas'])
         )
         
     coluna7, coluna8, coluna9 = st.columns(3)
     
     with coluna7:
-        count_aging = agendamentos['Aging'].value_counts()
-       
-        if not count_aging.empty:
-            fig_bar = px.bar(x=count_aging.index, y=count_aging.values, title='Agendamento em Aberto')
-            st.plotly_chart(fig_bar)
-            fig = px.pie(names=count_aging.index, values=count_aging.values, title='Agendamento em Aberto')
-            st.plotly_chart(fig)
-        else:
-             st.warning("Nenhum dado disponível para Agendamentos em Aberto.")
+        exibir_aging(cache_resultados, chave, agendamentos['aging'], 'Agendamento em Aberto', "Nenhum dado disponível para Agendamentos em Aberto.")
 
     with coluna8:
-        count_aging = coletas['Aging'].value_counts()
-          
-        if not count_aging.empty:
-            fig_bar = px.bar(x=count_aging.index, y=count_aging.values, title='Coleta em Aberto')
-            st.plotly_chart(fig_bar)
-            fig = px.pie(names=count_aging.index, values=count_aging.values, title='Coleta em Aberto')
-            st.plotly_chart(fig)
-        else:
-           st.warning("Nenhum dado disponível para Coletas em Aberto.")
+        exibir_aging(cache_resultados, chave, coletas['aging'], 'Coleta em Aberto', "Nenhum dado disponível para Coletas em Aberto.")
    
     with coluna9:
-        count_aging = devolucoes['Aging'].value_counts()
-
-        if not count_aging.empty:
-            fig_bar = px.bar(x=count_aging.index, y=count_aging.values, title='Devolução em Aberto')
-            st.plotly_chart(fig_bar)
-            fig = px.pie(names=count_aging.index, values=count_aging.values, title='Devolução em Aberto')
-            st.plotly_chart(fig)
-        else:
-            st.warning("Nenhum dado disponível para Devoluções em Aberto.")
+        exibir_aging(cache_resultados, chave, devolucoes['aging'], 'Devolução em Aberto', "Nenhum dado disponível para Devoluções em Aberto.")
 
 # Informações da aba "Insucesso"
-with aba2:
-    dados_aba = dados_filtrados
-    insucesso_agendamento = dados_aba[dados_aba['Última Ocorrência'].isin(ocorrencias_insucesso_de_agendamento)]
-    insucesso_coleta = dados_aba[dados_aba['Última Ocorrência'].isin(ocorrencia_insucesso_de_coleta)]
-    insuceso_devolucao = dados_aba[dados_aba['Última Ocorrência'].isin(correncia_insucesso_de_devolucao)]
+def aba2():
+    insucesso_agendamento = metricas(resumo, ocorrencias_insucesso_de_agendamento)
+    insucesso_coleta = metricas(resumo, ocorrencia_insucesso_de_coleta)
+    insuceso_devolucao = metricas(resumo, correncia_insucesso_de_devolucao)
     
     coluna_agendamento, coluna_coleta, coluna_devolucao = st.columns(3)
 
     with coluna_agendamento:
         st.metric(
             'Insucesso de Agendamento', 
-            formata_numero(insucesso_agendamento.shape[0])
+            formata_numero(insucesso_agendamento['linhas'])
         )
 
     with coluna_coleta:
         st.metric(
             'Insucesso de Coleta', 
-            formata_numero(insucesso_coleta.shape[0])
+            formata_numero(insucesso_coleta['linhas'])
         )
 
     with coluna_devolucao:
         st.metric(
             'Insucesso de Devolução', 
-            formata_numero(insuceso_devolucao.shape[0])
+            formata_numero(insuceso_devolucao['linhas'])
         )
 
     coluna10, coluna11, coluna12 = st.columns(3)
     
     with coluna10:
-        count_aging = insucesso_agendamento['Aging'].value_counts()
-
-        if not count_aging.empty:
-            fig_bar = px.bar(x=count_aging.index, y=count_aging.values, title='Insucesso de Agendamento')
-            st.plotly_chart(fig_bar)
-            fig = px.pie(names=count_aging.index, values=count_aging.values, title='Insucesso de Agendamento')
-            st.plotly_chart(fig)
-        else:
-            st.warning("Nenhum dado disponível para Insucesso de Agendamento.")
+        exibir_aging(cache_resultados, chave, insucesso_agendamento['aging'], 'Insucesso de Agendamento', "Nenhum dado disponível para Insucesso de Agendamento.")
             
     with coluna11:
-        count_aging = insucesso_coleta['Aging'].value_counts()
-
-        if not count_aging.empty:
-            fig_bar = px.bar(x=count_aging.index, y=count_aging.values, title='Insucesso de Coleta')
-            st.plotly_chart(fig_bar)
-            fig = px.pie(names=count_aging.index, values=count_aging.values, title='Insucesso de Coleta')
-            st.plotly_chart(fig)
-        else:
-            st.warning("Nenhum dado disponível para Insucesso de Coleta.")
+        exibir_aging(cache_resultados, chave, insucesso_coleta['aging'], 'Insucesso de Coleta', "Nenhum dado disponível para Insucesso de Coleta.")
             
     with coluna12:
-        count_aging = insuceso_devolucao['Aging'].value_counts()
-
-        if not count_aging.empty:
-            fig_bar = px.bar(x=count_aging.index, y=count_aging.values, title='Insucesso de Devolução')
-            st.plotly_chart(fig_bar)
-            fig = px.pie(names=count_aging.index, values=count_aging.values, title='Insucesso de Devolução')
-            st.plotly_chart(fig)
-        else:
-            st.warning("Nenhum dado disponível para Insucesso de Devolução.")
-with aba3:
-    # Data Tratada
-    dados['Data do frete'] = pd.to_datetime(dados['Data do frete'])
-    dados['Data Última Ocorrência'] = pd.to_datetime(dados['Data Última Ocorrência'])
-    dados['Data Coleta'] = pd.to_datetime(dados['Data Coleta'])
-    dados['Data Checklist'] = pd.to_datetime(dados['Data Checklist'])
-    dados['Data Última Tratativa'] = pd.to_datetime(dados['Data Última Tratativa'])
-    dados['Data Finalização Performance'] = pd.to_datetime(dados['Data Finalização Performance'])
-    dados['Nota Fiscal/Valor NF'] = dados['Nota Fiscal/Valor NF'].replace({'\$':'',',':''},regex=True).astype(float)
-
-    # Data tratada
-    dados_filtrados = dados.copy()
-    dados_filtrados['Data Última Ocorrência'] = dados_filtrados['Data Última Ocorrência'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Data do frete'] = dados_filtrados['Data do frete'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Data Coleta'] = dados_filtrados['Data Coleta'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Data Checklist'] = dados_filtrados['Data Checklist'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Data Última Tratativa'] = dados_filtrados['Data Última Tratativa'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Data Finalização Performance'] = dados_filtrados['Data Finalização Performance'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Nota Fiscal/Valor NF'] = dados['Nota Fiscal/Valor NF'].replace({'\$':'',',':''},regex=True).astype(float)
-    # Aplicar a formatação na coluna 'N° Minuta' em dados_filtrados
-    if 'N° Minuta' in dados_filtrados.columns:
-        dados_filtrados['N° Minuta'] = dados_filtrados['N° Minuta'].apply(lambda x: str(int(x)).replace(",", "") if pd.notna(x) and x != "" else "")
-    
+        exibir_aging(cache_resultados, chave, insuceso_devolucao['aging'], 'Insucesso de Devolução', "Nenhum dado disponível para Insucesso de Devolução.")
+def aba3():
     # Verifique se as colunas 'Agente de Coleta', 'N° Minuta' e 'Aging' estão no DataFrame
     colunas_desejadas = []
     
-    if 'Degradação' in dados.columns:
+    if 'Degradação' in fonte.colunas:
         colunas_desejadas.append('Degradação')
     
-    if 'N° Minuta' in dados.columns:
+    if 'N° Minuta' in fonte.colunas:
         colunas_desejadas.append('N° Minuta')
     
-    if 'Aging' in dados.columns:
+    if 'Aging' in fonte.colunas:
         colunas_desejadas.append('Aging')
     
-    if 'Nota Fiscal/Valor NF' in dados.columns:
-        colunas_desejadas.append('Valor NF')
+    if 'Nota Fiscal/Valor NF' in fonte.colunas:
+        colunas_desejadas.append('Nota Fiscal/Valor NF')
     
     if colunas_desejadas:
-        df_agentes = dados_filtrados[colunas_desejadas]
-          
         st.write("Tabela por Ocorrência:")
-        st.dataframe(df_agentes) 
+        exibir_tabela('ocorrencia', fonte.linhas(colunas_desejadas, resultado), formato_colunas, memo_aba)
     else:
         st.warning("Nenhuma das colunas 'Agente de Coleta' ou 'Aging' está disponível no DataFrame.")
 
 
-with aba4:
+def aba4():
     # Verifique se as colunas 'Agente de Coleta' e 'Aging' estão no DataFrame
     colunas_desejadas = []
     
-    if 'Agente de Coleta' in dados.columns:
+    if 'Agente de Coleta' in fonte.colunas:
         colunas_desejadas.append('Agente de Coleta')
     
-    if 'N° Minuta' in dados.columns:
-        # Aplicar a formatação na coluna 'N° Minuta'
-        dados['N° Minuta'] = dados['N° Minuta'].apply(lambda x: str(int(x)).replace(",", "") if pd.notna(x) and x != "" else "")
+    if 'N° Minuta' in fonte.colunas:
         colunas_desejadas.append('N° Minuta')
     
-    if 'Aging' in dados.columns:
+    if 'Aging' in fonte.colunas:
         colunas_desejadas.append('Aging')
 
     if colunas_desejadas:
-        df_agentes = dados[colunas_desejadas].drop_duplicates()  # Remove duplicatas, se necessário
-        
-        # Exibir a tabela com as colunas desejadas
+        # Exibir a tabela com as colunas desejadas (sem linhas repetidas)
         st.write("Tabela Agente de Coleta:")
-        st.dataframe(df_agentes)  # Exibe o DataFrame de forma interativa
+        exibir_tabela('agente', fonte.linhas(colunas_desejadas, distintas=True), formato_colunas, memo_aba)
     else:
         st.warning("Nenhuma das colunas 'Agente de Coleta' ou 'Aging' está disponível no DataFrame.")
 
-with aba5:
-      # Data Tratada
-    dados['Data do frete'] = pd.to_datetime(dados['Data do frete'])
-    dados['Data Última Ocorrência'] = pd.to_datetime(dados['Data Última Ocorrência'])
-    dados['Data Coleta'] = pd.to_datetime(dados['Data Coleta'])
-    dados['Data Checklist'] = pd.to_datetime(dados['Data Checklist'])
-    dados['Data Última Tratativa'] = pd.to_datetime(dados['Data Última Tratativa'])
-    dados['Data Finalização Performance'] = pd.to_datetime(dados['Data Finalização Performance'])
-    dados['Nota Fiscal/Valor NF'] = dados['Nota Fiscal/Valor NF'].replace({'\$':'',',':''},regex=True).astype(float)
-    
-    dados_filtrados = dados.copy()
-    
-    dados_filtrados['Data Última Ocorrência'] = dados_filtrados['Data Última Ocorrência'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Data do frete'] = dados_filtrados['Data do frete'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Data Coleta'] = dados_filtrados['Data Coleta'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Data Checklist'] = dados_filtrados['Data Checklist'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Data Última Tratativa'] = dados_filtrados['Data Última Tratativa'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Data Finalização Performance'] = dados_filtrados['Data Finalização Performance'].dt.strftime('%d/%m/%Y')
-    dados_filtrados['Nota Fiscal/Valor NF'] = dados['Nota Fiscal/Valor NF'].replace({'\$':'',',':''},regex=True).astype(float)
-    
+def aba5():
     colunas_desejadas = []
     
-    if 'Data Coleta' in dados.columns:
+    if 'Data Coleta' in fonte.colunas:
         colunas_desejadas.append('Data Coleta')
         
     if colunas_desejadas:
-        df_agentes = dados[colunas_desejadas].drop_duplicates()  # Remove duplicatas, se necessário
-        
-        # Exibir a tabela com as colunas desejadas
+        # Exibir a tabela com as colunas desejadas (sem linhas repetidas)
         st.write("Tabela Agente de Coleta:")
-        st.dataframe(df_agentes)  # Exibe o DataFrame de forma interativa
+        exibir_tabela('data_coleta', fonte.linhas(colunas_desejadas, distintas=True), formato_colunas, memo_aba)
     else:
         st.warning("Nenhuma das colunas 'Agente de Coleta' ou 'Aging' está disponível no DataFrame.")
     
-with aba7:
+def aba7():
     
-     dados_aba = dados_filtrados
-     agendamentos = dados_aba[dados_aba['Última Ocorrência'].isin(ocorrencias_agendamento_em_aberto)]
-     coletas = dados_aba[dados_aba['Última Ocorrência'].isin(ocorrencias_coleta_em_aberto)]
-     checklist = dados_aba[dados_aba['Última Ocorrência'].isin(aguardando_check_list)]
-     insucesso_agendamento = dados_aba[dados_aba['Última Ocorrência'].isin(insucesso_agendamento)]
-     coleta_em_aberto =  dados_aba[dados_aba['Última Ocorrência'].isin(coleta_em_aberto)]
-     insucesso_coleta = dados_aba[dados_aba['Última Ocorrência'].isin(insucesso_coleta)]
-     devolucao = dados_aba[dados_aba['Última Ocorrência'].isin(devolvido)]
-     insuceso_devolucao = dados_aba[dados_aba['Última Ocorrência'].isin(correncia_insucesso_de_devolucao)]
-     pendencia_em_aberto = dados_aba[dados_aba['Última Ocorrência'].isin(pendecia)]
+     agendamentos = metricas(resumo, ocorrencias_agendamento_em_aberto)
+     coletas = metricas(resumo, ocorrencias_coleta_em_aberto)
+     checklist = metricas(resumo, aguardando_check_list)
+     insucesso_agendamento = metricas(resumo, ocorrencias_insucesso_de_agendamento)
+     coleta_em_aberto_aba = metricas(resumo, coleta_em_aberto)
+     insucesso_coleta = metricas(resumo, ocorrencia_insucesso_de_coleta)
+     devolucao = metricas(resumo, devolvido)
+     insuceso_devolucao = metricas(resumo, correncia_insucesso_de_devolucao)
+     pendencia_em_aberto = metricas(resumo, pendecia)
      
    
 
@@ -482,25 +345,25 @@ with aba7:
      with coluna13:
          st.metric(
              'Aguardando Check List',
-             formata_numero(checklist.shape[0])
+             formata_numero(checklist['linhas'])
          ) 
      
      with coluna14:
         st.metric(
             'Agendamento em Aberto', 
-            formata_numero(agendamentos.shape[0])
+            formata_numero(agendamentos['linhas'])
         )
       
      with coluna15:
         st.metric(
             'Insucesso de Agendamento', 
-            formata_numero(insucesso_agendamento.shape[0])
+            formata_numero(insucesso_agendamento['linhas'])
         )
       
      with coluna16:
         st.metric(
             'Coleta em Aberto', 
-            formata_numero(coleta_em_aberto.shape[0])
+            formata_numero(coleta_em_aberto_aba['linhas'])
         )
       
      coluna17, coluna18, coluna19,coluna20 = st.columns(4) 
@@ -508,26 +371,78 @@ with aba7:
      with coluna17:
          st.metric(
              'Insucesso de Coleta',
-             formata_numero(insucesso_coleta.shape[0])
+             formata_numero(insucesso_coleta['linhas'])
          )
      
      with coluna18:
          st.metric(
              'Devolução',
-             formata_numero(devolucao.shape[0])
+             formata_numero(devolucao['linhas'])
          )
      
       
      with coluna19:
          st.metric(
              'Insucesso de Devolução',
-             formata_numero(insuceso_devolucao.shape[0])
+             formata_numero(insuceso_devolucao['linhas'])
          )
         
      
      with coluna20:
          st.metric(
              'Pendência em Aberto',
-             formata_numero(insuceso_devolucao.shape[0])
+             formata_numero(pendencia_em_aberto['linhas'])
          )
-        
\ No newline at end of file
+        
+
+# Tentativas de coleta do histórico de ocorrências (não do relatório atual,
+# que só tem a última ocorrência de cada frete)
+def aba10():
+    historico = load_eventos(versao)
+    calculo = memo_aba('tentativas', lambda: eventos.tentativas(historico.filtrar(selecao)))
+    fretes = calculo['fretes']
+    if fretes.empty:
+        st.warning("Nenhuma tentativa de coleta no histórico de ocorrências.")
+        return
+    st.caption('Histórico montado a partir das versões do relatório; usa só os filtros de Cliente e Regional.')
+
+    coluna21, coluna22, coluna23, coluna24 = st.columns(4)
+
+    with coluna21:
+        st.metric('Fretes com Tentativa', formata_numero(len(fretes)))
+
+    with coluna22:
+        st.metric('Tentativas por Frete', f"{fretes['Tentativas'].mean():.2f}")
+
+    with coluna23:
+        st.metric('Taxa de Sucesso', f"{100 * fretes['Coletado'].mean():.1f}%")
+
+    with coluna24:
+        intervalos = calculo['intervalos']
+        st.metric('Intervalo Mediano', f'{np.median(intervalos):.1f} dias' if len(intervalos) else '-')
+
+    distribuicao = calculo['distribuicao']
+    figura = memo_aba('tentativas_grafico', lambda: px.bar(
+        x=distribuicao.index, y=distribuicao.values, title='Fretes por Número de Tentativas',
+        labels={'x': 'Tentativas', 'y': 'Fretes'},
+    ))
+    st.plotly_chart(figura)
+
+    st.write("Tentativas por Agente de Coleta:")
+    por_agente = calculo['por_agente']
+    exibir_tabela('tentativas_agente', LinhasMemoria(por_agente, por_agente.columns.tolist()),
+                  formato_tentativas, memo_aba)
+
+    minuta = st.text_input('Histórico da minuta', key='tentativas_minuta').strip()
+    if minuta.isdigit():
+        st.dataframe(historico.de_minuta(int(minuta)), column_config=formato_colunas)
+
+
+ABAS_IMPLEMENTADAS = {
+    'Em Aberto': aba1, 'Insucesso': aba2, 'Por Ocorrência': aba3,
+    'Por Agente': aba4, 'Data Coleta': aba5, 'Relatório': aba7,
+    'Tentativas': aba10,
+}
+if aba_selecionada in ABAS_IMPLEMENTADAS:
+    with instrumentacao.etapa(f'aba:{aba_selecionada}'):
+        ABAS_IMPLEMENTADAS[aba_selecionada]()
@@ -0,0 +1,42 @@
+# Faixas de aging calculadas de forma vetorizada.
+#
+# A diferença em dias é feita numa única operação datetime64 contra um único
+# "agora" por execução, e cada dia é mapeado para a faixa por busca binária
+# nos limites abaixo (equivalente a um pd.cut).
+import numpy as np
+import pandas as pd
+
+FAIXAS_AGING = [
+    "24h",
+    "1 a 2 dias",
+    "3 a 5 dias",
+    "6 a 10 dias",
+    "11 a 15 dias",
+    "16 a 20 dias",
+    "21 a 24 dias",
+    "25 a 30 dias",
+    "31 a 60 dias",
+    "> 60 dias",
+    # Datas futuras ou vazias (mesmo comportamento do classify_aging antigo)
+    "> 30 dias",
+]
+
+# Último dia de cada faixa, na ordem de FAIXAS_AGING
+_LIMITES_DIAS = np.array([0, 2, 5, 10, 15, 20, 24, 30, 60])
+_FAIXA_SEM_DATA = FAIXAS_AGING.index("> 30 dias")
+
+TIPO_AGING = pd.CategoricalDtype(FAIXAS_AGING, ordered=True)
+
+
+# Dias completos entre a data e o agora (mesma regra do Timedelta.days);
+# NaN onde a data é vazia
+def dias_desde(datas: pd.Series, agora: pd.Timestamp = None) -> np.ndarray:
+    agora = pd.Timestamp.now() if agora is None else agora
+    return (agora - pd.to_datetime(datas)).dt.days.to_numpy(dtype='float64')
+
+
+def classificar_aging(datas: pd.Series, agora: pd.Timestamp = None) -> pd.Series:
+    dias = dias_desde(datas, agora)
+    codigos = np.searchsorted(_LIMITES_DIAS, dias, side='left').astype('int8')
+    codigos[np.isnan(dias) | (dias < 0)] = _FAIXA_SEM_DATA
+    return pd.Series(pd.Categorical.from_codes(codigos, dtype=TIPO_AGING), index=datas.index, name='Aging')
@@ -0,0 +1,477 @@
+# Atualização incremental do snapshot do relatório de agendamento.
+#
+# Localiza o relatório mais recente no servidor do RPA, usa ETag/Last-Modified
+# e o hash do conteúdo para saber se algo mudou e, quando mudou, lê o
+# relatório em blocos e recalcula as colunas derivadas apenas das linhas de
+# frete novas ou alteradas.
+#
+# Nenhuma etapa tem a versão inteira em memória: da versão atual só as
+# colunas internas são lidas para a comparação, as linhas sem mudança vêm
+# dos row groups que as contêm, e o cubo, os eventos e as ocorrências sem
+# classificação são acumulados dos blocos enquanto eles são gravados.
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from urllib.parse import urljoin
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import requests
+
+import banco
+import eventos
+import ingestao
+import snapshot
+from config import (url_relatorio, chave_frete, intervalo_verificacao_min, backend_dados, manter_fretes_ausentes,
+                    atualizar_sobre_etl)
+from classificacao import ocorrencias_nao_mapeadas
+from cubo import juntar_cubos, montar_cubo
+from esquema import categorizar
+from instrumentacao import etapa, medir
+from transformacoes import aplicar_derivadas, calcular_aging
+
+PADRAO_RELATORIO = re.compile(r'agendamento-2023-FULL_(\d{4}_\d{2}_\d{2}_\d{2}_\d{2})\.(xlsx|csv)')
+
+# Colunas internas gravadas no snapshot para a comparação entre versões
+COLUNA_CHAVE = '_chave'
+COLUNA_HASH = '_hash'
+# Hash do par (minuta, ocorrência, data) da linha, para o histórico (eventos.py)
+COLUNA_EVENTO = '_evento'
+COLUNAS_PAR = ['N° Minuta', 'Última Ocorrência', 'Data Última Ocorrência']
+
+# Quem publicou a versão vigente ('origem' nos metadados)
+ORIGEM_RPA = 'rpa'
+ORIGEM_ETL = 'etl'
+
+# Muda quando o formato das colunas gravadas muda; um snapshot de formato
+# anterior é refeito por inteiro na próxima atualização
+VERSAO_FORMATO = 8
+
+_trava = threading.Lock()
+
+# Versão do snapshot que este processo já sabe estar carregada no banco
+_versao_no_banco = None
+
+
+# Uma atualização por vez: entre as threads do processo (_trava) e entre os
+# processos que publicam na mesma pasta (snapshot.trava_publicacao). Quem
+# esperou lê os metadados só dentro da trava, já com o que o outro publicou
+@contextmanager
+def _publicacao():
+    with _trava, snapshot.trava_publicacao():
+        yield
+
+
+# Lê a listagem da pasta de relatórios e escolhe o timestamp mais novo
+# (o .csv, se o servidor também o oferecer, por ser lido mais rápido); se a
+# listagem não estiver disponível, usa o relatório do config
+def localizar_relatorio_mais_recente(url: str = url_relatorio) -> str:
+    pasta = url.rsplit('/', 1)[0] + '/'
+    try:
+        resposta = requests.get(pasta, timeout=30)
+        resposta.raise_for_status()
+    except requests.RequestException:
+        return url
+
+    encontrados = set(PADRAO_RELATORIO.findall(resposta.text))
+    if not encontrados:
+        return url
+    mais_recente = max(momento for momento, _ in encontrados)
+    extensao = 'csv' if (mais_recente, 'csv') in encontrados else 'xlsx'
+    return urljoin(pasta, f'agendamento-2023-FULL_{mais_recente}.{extensao}')
+
+
+def consultar_cabecalhos(url: str) -> dict:
+    try:
+        resposta = requests.head(url, timeout=30, allow_redirects=True)
+        resposta.raise_for_status()
+    except requests.RequestException:
+        return {}
+    return {
+        'etag': resposta.headers.get('ETag'),
+        'last_modified': resposta.headers.get('Last-Modified'),
+    }
+
+
+def _mesmo_arquivo(metadados: dict, url: str, cabecalhos: dict) -> bool:
+    if metadados.get('url') != url:
+        return False
+    validadores = [campo for campo in ('etag', 'last_modified') if cabecalhos.get(campo)]
+    return bool(validadores) and all(metadados.get(campo) == cabecalhos[campo] for campo in validadores)
+
+
+def _verificado_recentemente(metadados: dict, agora: datetime) -> bool:
+    verificado_em = metadados.get('verificado_em')
+    if not verificado_em:
+        return False
+    return agora - datetime.fromisoformat(verificado_em) < timedelta(minutes=intervalo_verificacao_min)
+
+
+# Snapshot existente, no formato atual, com o aging do dia e conferido com o
+# servidor há menos de intervalo_verificacao_min minutos
+def _vigente(metadados: dict, agora: datetime) -> bool:
+    return (
+        snapshot.existe_snapshot()
+        and metadados.get('formato') == VERSAO_FORMATO
+        and metadados.get('data_referencia') == agora.date().isoformat()
+        and _verificado_recentemente(metadados, agora)
+    )
+
+
+# Chave de cada linha: identificadores do frete + ordem de aparição, para
+# que fretes repetidos no relatório (várias NFs) não colidam entre si.
+# O hash cobre apenas as colunas brutas do relatório. `contagem` guarda
+# quantas vezes cada frete já apareceu nos blocos anteriores.
+def identificar_linhas(df: pd.DataFrame, contagem: 'ContagemFretes' = None) -> pd.DataFrame:
+    df[COLUNA_HASH] = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    chave = df[chave_frete].copy()
+    chave['ordem'] = df.groupby(chave_frete, dropna=False, sort=False).cumcount()
+    if contagem is not None:
+        chave['ordem'] += contagem.acrescentar(hash_frete(df))
+    df[COLUNA_CHAVE] = pd.util.hash_pandas_object(chave, index=False).to_numpy()
+    return df
+
+
+# Hash só dos identificadores do frete (sem a ordem): o mesmo em todas as
+# linhas (NFs) do frete
+def hash_frete(df: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(df[chave_frete], index=False).to_numpy()
+
+
+# Vezes que cada frete (hash dos identificadores) apareceu nos blocos já
+# lidos, em arrays ordenados: 16 bytes por frete, em vez de um dict do
+# Python com um objeto por frete
+class ContagemFretes:
+    def __init__(self):
+        self._fretes = np.empty(0, dtype='uint64')
+        self._vezes = np.empty(0, dtype='int64')
+
+    # Quantas vezes cada frete dado já apareceu (zero para os que não estão)
+    def vezes(self, fretes: np.ndarray) -> np.ndarray:
+        posicoes = np.searchsorted(self._fretes, fretes)
+        encontrado = posicoes < len(self._fretes)
+        encontrado[encontrado] = self._fretes[posicoes[encontrado]] == fretes[encontrado]
+        anteriores = np.zeros(len(fretes), dtype='int64')
+        anteriores[encontrado] = self._vezes[posicoes[encontrado]]
+        return anteriores
+
+    def somar(self, fretes: np.ndarray):
+        novos, vezes = np.unique(fretes, return_counts=True)
+        self._fretes, inverso = np.unique(np.concatenate([self._fretes, novos]), return_inverse=True)
+        self._vezes = np.bincount(inverso, np.concatenate([self._vezes, vezes])).astype('int64')
+
+    # Devolve quantas vezes cada frete do bloco já tinha aparecido e soma o
+    # bloco à contagem
+    def acrescentar(self, fretes: np.ndarray) -> np.ndarray:
+        anteriores = self.vezes(fretes)
+        self.somar(fretes)
+        return anteriores
+
+
+# Só as colunas internas de uma versão gravada, que é o que a comparação
+# usa. Num snapshot de formato anterior, sem _evento, ele é calculado aqui
+# das colunas do par, lidas só para isso.
+def ler_internas(caminho: str) -> pd.DataFrame:
+    nomes = pq.read_schema(caminho).names
+    colunas = [coluna for coluna in (COLUNA_CHAVE, COLUNA_HASH, COLUNA_EVENTO) if coluna in nomes]
+    par = []
+    if COLUNA_EVENTO not in nomes and {'N° Minuta', 'Última Ocorrência'} <= set(nomes):
+        par = [coluna for coluna in COLUNAS_PAR if coluna in nomes]
+    internas = pd.read_parquet(caminho, columns=colunas + par)
+    if par:
+        internas[COLUNA_EVENTO] = eventos.hash_evento(internas)
+    return internas.drop(columns=par)
+
+
+# Eventos novos (eventos.py) de uma versão: linhas que não estavam na versão
+# anterior (pela _chave) ou estavam com outro _evento. `anterior` são as
+# colunas internas dessa versão (ler_internas). Só as linhas passadas a
+# `comparar` são olhadas; a Mesclagem passa só as novas ou alteradas.
+# Sem versão anterior, todas as linhas comparadas viram eventos.
+class Comparacao:
+    def __init__(self, anterior: pd.DataFrame = None):
+        self.partes = []
+        self._indice = None
+        if anterior is not None and {COLUNA_CHAVE, COLUNA_EVENTO} <= set(anterior.columns):
+            self._indice = pd.Index(anterior[COLUNA_CHAVE])
+            self._eventos = anterior[COLUNA_EVENTO].to_numpy()
+
+    # posicoes: as das linhas na versão anterior, se quem chama já tem
+    def comparar(self, linhas: pd.DataFrame, posicoes: np.ndarray = None):
+        if COLUNA_EVENTO not in linhas.columns or linhas.empty:
+            return
+        novo = np.ones(len(linhas), dtype=bool)
+        if self._indice is not None:
+            if posicoes is None:
+                posicoes = self._indice.get_indexer(linhas[COLUNA_CHAVE])
+            novo = (posicoes == -1) | (self._eventos[posicoes] != linhas[COLUNA_EVENTO].to_numpy())
+        if novo.any():
+            self.partes.append(eventos.observados(linhas[novo]))
+
+
+def _marcar_eventos(bloco: pd.DataFrame) -> pd.DataFrame:
+    if 'N° Minuta' in bloco.columns and 'Última Ocorrência' in bloco.columns:
+        bloco[COLUNA_EVENTO] = eventos.hash_evento(bloco)
+    return bloco
+
+
+# Junta o relatório novo, bloco a bloco, ao snapshot atual (o arquivo em
+# `caminho`): linhas sem mudança são mantidas como estão (com as derivadas
+# já calculadas) e só as novas ou alteradas passam por aplicar_derivadas.
+# Do snapshot atual ficam em memória só as colunas internas; as linhas
+# mantidas são lidas dos row groups que as contêm. Linhas do snapshot que
+# não aparecem no relatório novo saem, já que o relatório é a base completa
+# (com manter_fretes_ausentes, continuam no snapshot, no fim). Com uma
+# Comparacao (da mesma versão, se houver), as linhas novas ou alteradas são
+# comparadas com a versão anterior para o histórico.
+class Mesclagem:
+    def __init__(self, caminho: str = None, internas: pd.DataFrame = None, recalcular_aging: bool = False,
+                 manter_ausentes: bool = manter_fretes_ausentes, comparacao: Comparacao = None):
+        if caminho is not None and internas is None:
+            internas = ler_internas(caminho)
+        if internas is not None and COLUNA_HASH not in internas.columns:
+            caminho = None
+        self.arquivo = pq.ParquetFile(caminho) if caminho is not None else None
+        self.recalcular_aging = recalcular_aging
+        self.manter_ausentes = manter_ausentes
+        self.comparacao = comparacao
+        self.alterados = 0
+        self._contagem = ContagemFretes()
+        if self.arquivo is not None:
+            self._indice = pd.Index(internas[COLUNA_CHAVE])
+            self._hashes = internas[COLUNA_HASH].to_numpy()
+            self._vistas = np.zeros(len(internas), dtype=bool)
+            tamanhos = [self.arquivo.metadata.row_group(grupo).num_rows for grupo in range(self.arquivo.num_row_groups)]
+            self._inicios = np.concatenate([[0], np.cumsum(tamanhos)])
+            self._grupo = (None, None)
+
+    @medir('mesclagem_bloco')
+    def bloco(self, novo: pd.DataFrame) -> pd.DataFrame:
+        novo = identificar_linhas(novo, self._contagem)
+        if self.arquivo is None:
+            self.alterados += len(novo)
+            bloco = self._concluir(_marcar_eventos(aplicar_derivadas(novo)))
+            if self.comparacao is not None:
+                self.comparacao.comparar(bloco)
+            return bloco
+
+        posicoes = self._indice.get_indexer(novo[COLUNA_CHAVE])
+        alterado = (posicoes == -1) | (self._hashes[posicoes] != novo[COLUNA_HASH].to_numpy())
+        self._vistas[posicoes[posicoes != -1]] = True
+        self.alterados += int(alterado.sum())
+
+        mantidos = self._linhas(posicoes[~alterado])
+        if not alterado.any():
+            return self._concluir(mantidos)
+        alterados = _marcar_eventos(aplicar_derivadas(novo[alterado].copy()))
+        bloco = self._concluir(pd.concat([mantidos, alterados], ignore_index=True) if len(mantidos) else alterados)
+        # As alteradas são as últimas linhas do bloco
+        if self.comparacao is not None:
+            self.comparacao.comparar(bloco.iloc[len(mantidos):], posicoes[alterado])
+        return bloco
+
+    # Linhas do snapshot atual nas posições dadas, na mesma ordem, lidas só
+    # dos row groups que as contêm
+    def _linhas(self, posicoes: np.ndarray) -> pd.DataFrame:
+        grupos = np.searchsorted(self._inicios, posicoes, side='right') - 1
+        ordem = np.argsort(grupos, kind='stable')
+        partes = [
+            self._ler_grupo(grupo).take(posicoes[grupos == grupo] - self._inicios[grupo])
+            for grupo in np.unique(grupos)
+        ] or [self._ler_grupo(0).iloc[:0]]
+        linhas = pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+        return linhas.take(np.argsort(ordem))
+
+    # Os blocos do relatório vêm na ordem do snapshot, então o último row
+    # group lido costuma servir para o bloco seguinte
+    def _ler_grupo(self, grupo: int) -> pd.DataFrame:
+        if self._grupo[0] != grupo:
+            self._grupo = (grupo, snapshot.ler_grupo(self.arquivo, grupo))
+        return self._grupo[1]
+
+    # Linhas do snapshot atual que nenhum bloco trouxe, se forem mantidas
+    def restantes(self):
+        if not self.manter_ausentes or self.arquivo is None:
+            return
+        for grupo in range(self.arquivo.num_row_groups):
+            ausentes = ~self._vistas[self._inicios[grupo]:self._inicios[grupo + 1]]
+            if ausentes.any():
+                yield self._concluir(self._ler_grupo(grupo)[ausentes])
+
+    def _concluir(self, bloco: pd.DataFrame) -> pd.DataFrame:
+        bloco = categorizar(bloco.reset_index(drop=True))
+        if self.recalcular_aging:
+            bloco = calcular_aging(bloco)
+        return ingestao.normalizar_bloco(bloco)
+
+    # Todos os blocos já mesclados, prontos para gravar
+    def blocos(self, brutos):
+        for bruto in brutos:
+            yield self.bloco(bruto)
+        yield from self.restantes()
+
+
+# O que a publicação de uma versão precisa dos blocos, acumulado enquanto
+# eles passam para a gravação: o cubo, as ocorrências sem classificação e,
+# com uma Comparacao, os eventos novos que ela separou
+class Publicacao:
+    def __init__(self, comparacao: Comparacao = None):
+        self.comparacao = comparacao
+        self.cubo = None
+        self.nao_mapeadas = pd.Series(dtype='int64')
+        self.linhas = 0
+
+    def acompanhar(self, blocos):
+        for bloco in blocos:
+            self.linhas += len(bloco)
+            cubo = montar_cubo(bloco)
+            self.cubo = cubo if self.cubo is None else juntar_cubos([self.cubo, cubo])
+            self.nao_mapeadas = self.nao_mapeadas.add(ocorrencias_nao_mapeadas(bloco['Última Ocorrência']), fill_value=0)
+            yield bloco
+
+
+def _nova_versao(agora: datetime) -> str:
+    return agora.strftime('%Y%m%d%H%M%S%f')
+
+
+# O arquivo da versão já está gravado; o cubo (da Publicacao) e o Arrow das
+# páginas da versão são gravados ao lado, os eventos novos entram no
+# histórico e trocar os metadados é o que publica. Ficam no disco a versão
+# nova e a anterior.
+def _registrar(metadados: dict, agora: datetime, versao: str, publicacao: Publicacao, **campos) -> dict:
+    anterior = metadados.get('versao')
+    with etapa('cubo', publicacao.linhas):
+        snapshot.gravar_cubo(publicacao.cubo, versao)
+    snapshot.gravar_arrow_do_parquet(snapshot.caminho_snapshot(versao), snapshot.caminho_arrow(versao))
+    if publicacao.comparacao is not None:
+        eventos.registrar(publicacao.comparacao.partes, versao, agora)
+    nao_mapeadas = publicacao.nao_mapeadas
+    metadados = {
+        **metadados,
+        **campos,
+        'versao': versao,
+        'formato': VERSAO_FORMATO,
+        'data_referencia': agora.date().isoformat(),
+        'verificado_em': agora.isoformat(),
+        'ocorrencias_nao_mapeadas': nao_mapeadas[nao_mapeadas > 0].sort_values(ascending=False).astype(int).to_dict(),
+    }
+    snapshot.gravar_metadados(metadados)
+    snapshot.limpar_versoes([versao, anterior])
+    return metadados
+
+
+# Mesmo arquivo no servidor: só o aging precisa mudar quando vira o dia
+# (sem eventos). A versão é regravada row group a row group.
+def _manter(metadados: dict, agora: datetime, **campos) -> dict:
+    if metadados.get('data_referencia') != agora.date().isoformat():
+        versao = _nova_versao(agora)
+        publicacao = Publicacao()
+        blocos = (calcular_aging(bloco) for bloco in snapshot.ler_blocos(snapshot.caminho_snapshot()))
+        snapshot.gravar_snapshot_em_blocos(publicacao.acompanhar(blocos), snapshot.caminho_snapshot(versao))
+        return _registrar(metadados, agora, versao, publicacao, **campos)
+
+    metadados = {**metadados, **campos, 'verificado_em': agora.isoformat()}
+    snapshot.gravar_metadados(metadados)
+    return metadados
+
+
+def atualizar_snapshot(forcar: bool = False) -> dict:
+    with _publicacao():
+        agora = datetime.now()
+        metadados = snapshot.ler_metadados()
+        existe = snapshot.existe_snapshot()
+        forcar = forcar or (existe and metadados.get('formato') != VERSAO_FORMATO)
+
+        if not forcar and _vigente(metadados, agora):
+            return metadados
+
+        # Versão do ETL vigente: o relatório do RPA não a substitui, só o aging muda
+        if existe and not forcar and metadados.get('origem') == ORIGEM_ETL and not atualizar_sobre_etl:
+            return _manter(metadados, agora)
+
+        url = localizar_relatorio_mais_recente()
+        cabecalhos = consultar_cabecalhos(url)
+        if existe and not forcar and _mesmo_arquivo(metadados, url, cabecalhos):
+            return _manter(metadados, agora)
+
+        arquivo, sha256 = ingestao.baixar_para_arquivo(url)
+        with arquivo:
+            if existe and not forcar and metadados.get('sha256') == sha256:
+                return _manter(metadados, agora, url=url, **cabecalhos)
+
+            # Num formato anterior o snapshot é refeito, mas ainda serve de base
+            # para os eventos
+            internas = ler_internas(snapshot.caminho_snapshot()) if existe else None
+            mesmo_formato = metadados.get('formato') == VERSAO_FORMATO
+            comparacao = Comparacao(internas)
+            mesclagem = Mesclagem(
+                snapshot.caminho_snapshot() if existe and mesmo_formato else None,
+                internas,
+                recalcular_aging=mesmo_formato and metadados.get('data_referencia') != agora.date().isoformat(),
+                comparacao=comparacao,
+            )
+            del internas
+            publicacao = Publicacao(comparacao)
+            brutos = ingestao.ler_blocos(arquivo, ingestao.formato_de(url))
+            versao = _nova_versao(agora)
+            snapshot.gravar_snapshot_em_blocos(
+                publicacao.acompanhar(mesclagem.blocos(brutos)), snapshot.caminho_snapshot(versao)
+            )
+
+        return _registrar(
+            metadados, agora, versao, publicacao, origem=ORIGEM_RPA, relatorios=None,
+            url=url, sha256=sha256, linhas_alteradas=mesclagem.alterados, **cabecalhos
+        )
+
+
+# Publica como versão vigente um snapshot transformado fora da atualização
+# (python -m etl); os blocos já vêm classificados e são gravados como estão.
+# Os eventos novos saem da comparação de cada bloco com a versão vigente
+def publicar_blocos(blocos, **campos) -> dict:
+    def comparar(blocos, comparacao):
+        for bloco in blocos:
+            comparacao.comparar(bloco)
+            yield bloco
+
+    with _publicacao():
+        agora = datetime.now()
+        versao = _nova_versao(agora)
+        comparacao = Comparacao(ler_internas(snapshot.caminho_snapshot()) if snapshot.existe_snapshot() else None)
+        publicacao = Publicacao(comparacao)
+        snapshot.gravar_snapshot_em_blocos(
+            publicacao.acompanhar(comparar(blocos, comparacao)), snapshot.caminho_snapshot(versao)
+        )
+        return _registrar(snapshot.ler_metadados(), agora, versao, publicacao, **campos)
+
+
+# Chamado pelas páginas: devolve a versão vigente do snapshot, verificando o
+# servidor no máximo a cada intervalo_verificacao_min minutos. Se o servidor
+# estiver fora do ar, segue servindo o snapshot que já existe.
+def garantir_snapshot() -> str:
+    metadados = snapshot.ler_metadados()
+    agora = datetime.now()
+    if not _vigente(metadados, agora):
+        try:
+            metadados = atualizar_snapshot()
+        except requests.RequestException:
+            if not snapshot.existe_snapshot():
+                raise
+
+    versao = metadados.get('versao', 'local')
+    if backend_dados == 'mariadb':
+        sincronizar_banco(versao)
+    return versao
+
+
+# Com backend_dados = 'mariadb', carrega no banco a versão do snapshot que
+# ainda não está lá (consulta o banco só quando a versão muda)
+def sincronizar_banco(versao: str):
+    global _versao_no_banco
+    if _versao_no_banco == versao:
+        return
+    with _publicacao():
+        if banco.versao() != versao:
+            banco.carregar(snapshot.carregar_snapshot(versao=versao), versao)
+        _versao_no_banco = versao
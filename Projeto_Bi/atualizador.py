@@ -0,0 +1,76 @@
+# Atualização do snapshot em segundo plano.
+#
+# Uma thread por processo verifica o servidor do RPA a cada
+# intervalo_verificacao_min minutos (garantir_snapshot), publica as versões
+# novas e já deixa nos caches das páginas o que elas usam da versão nova.
+# As páginas só leem a versão publicada: nenhuma sessão espera o download,
+# a não ser quando ainda não existe snapshot algum, e aí todas as sessões
+# esperam a mesma carga (a trava de atualizar_snapshot, que vale também
+# entre processos). `python atualizador.py` roda o mesmo laço como processo
+# separado; com atualizador_externo no config as páginas não iniciam a
+# thread e só leem o que esse processo publica.
+import logging
+import threading
+import time
+
+import snapshot
+from atualizacao import garantir_snapshot, sincronizar_banco
+from config import intervalo_verificacao_min, backend_dados, atualizador_externo
+
+log = logging.getLogger(__name__)
+
+_aquecedores = {}
+_trava = threading.Lock()
+_thread = None
+
+
+# Função de uma página que carrega (e deixa no cache) o que a página usa de
+# uma versão; a página registra a cada execução e vale a mais recente
+def registrar_aquecimento(nome: str, aquecer):
+    _aquecedores[nome] = aquecer
+
+
+def verificar() -> str:
+    versao = garantir_snapshot()
+    for nome, aquecer in list(_aquecedores.items()):
+        try:
+            aquecer(versao)
+        except Exception:
+            log.exception('Falha ao pré-carregar %s da versão %s', nome, versao)
+    return versao
+
+
+def _laco():
+    while True:
+        try:
+            verificar()
+        except Exception:
+            log.exception('Falha na atualização do snapshot')
+        time.sleep(intervalo_verificacao_min * 60)
+
+
+# Inicia a thread uma vez por processo (as páginas chamam a cada execução),
+# a não ser que a atualização rode no processo separado
+def iniciar():
+    global _thread
+    if atualizador_externo:
+        return
+    with _trava:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_laco, name='atualizador-snapshot', daemon=True)
+            _thread.start()
+
+
+# Versão que as páginas usam: a publicada, sem consultar o servidor
+def versao_publicada() -> str:
+    if not snapshot.existe_snapshot():
+        return garantir_snapshot()
+    versao = snapshot.versao_vigente()
+    if backend_dados == 'mariadb':
+        sincronizar_banco(versao)
+    return versao
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    _laco()
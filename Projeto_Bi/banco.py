@@ -0,0 +1,226 @@
+# Relatório de agendamento no MariaDB do docker-compose.yml.
+#
+# A cada versão do snapshot o relatório já tratado é carregado numa tabela
+# indexada (Cliente, Data do frete, Última Ocorrência, Agente de Coleta e
+# Aging) e trocado de uma vez com RENAME TABLE. Com backend_dados = 'mariadb'
+# os filtros da barra lateral e as métricas das abas viram SQL: as páginas
+# recebem só agregados ou as linhas de uma tabela. `python banco.py` carrega
+# o snapshot atual no banco e mede algumas consultas.
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, inspect, text, types
+
+from config import url_banco, tamanho_pool_banco, campos_busca
+from cubo import grupos_de
+
+TABELA = 'agendamento'
+TABELA_CARGA = 'agendamento_carga'
+TABELA_ANTERIOR = 'agendamento_anterior'
+TABELA_VERSAO = 'agendamento_versao'
+
+# Índices criados na carga: nome -> colunas
+INDICES = {
+    'ix_cliente': ['Cliente'],
+    'ix_data_frete': ['Data do frete'],
+    'ix_ultima_ocorrencia': ['Última Ocorrência'],
+    'ix_agente_coleta': ['Agente de Coleta'],
+    'ix_aging': ['Aging'],
+    'ix_ano_mes': ['ano', 'mes'],
+    **{f'ix_busca_{i}': [coluna] for i, coluna in enumerate(campos_busca.values())},
+}
+
+# Dimensão da seleção (a mesma do índice de filtros) -> coluna da tabela;
+# as demais chaves da seleção são o próprio nome da coluna (busca)
+COLUNAS_FILTRO = {
+    'Cliente': 'Cliente',
+    'Aging': 'Aging',
+    'Regional': 'Regional',
+    'Degradação': 'Degradação',
+    'Ano': 'ano',
+    'Mês': 'mes',
+}
+
+# Colunas gravadas só para as consultas; não aparecem nas páginas
+COLUNAS_INTERNAS = ['ano', 'mes', 'grupo']
+
+TAMANHO_LOTE = 5000
+
+_motor = None
+_trava = threading.Lock()
+
+
+# Uma engine por processo; o pool de conexões é compartilhado pelas sessões
+def motor():
+    global _motor
+    with _trava:
+        if _motor is None:
+            _motor = create_engine(
+                url_banco,
+                pool_size=tamanho_pool_banco,
+                max_overflow=tamanho_pool_banco,
+                pool_pre_ping=True,
+                pool_recycle=3600,
+            )
+    return _motor
+
+
+def _nome(coluna: str) -> str:
+    return '`' + coluna.replace('`', '``') + '`'
+
+
+# Valor da seleção que filtra pelo começo do texto (busca por prefixo)
+class Prefixo(str):
+    pass
+
+
+# Categorias e texto indexado (colunas de busca) viram VARCHAR; o resto do
+# texto, TEXT
+def _tipos_sql(tabela: pd.DataFrame) -> dict:
+    indexadas = {coluna for colunas in INDICES.values() for coluna in colunas}
+    tipos = {}
+    for coluna in tabela.columns:
+        tipo = tabela[coluna].dtype
+        if pd.api.types.is_numeric_dtype(tipo) or pd.api.types.is_datetime64_any_dtype(tipo):
+            continue
+        if isinstance(tipo, pd.CategoricalDtype) or coluna in indexadas:
+            tipos[coluna] = types.String(255)
+        else:
+            tipos[coluna] = types.Text()
+    return tipos
+
+
+# Relatório tratado + ano/mês do frete e o grupo de listas de ocorrência
+# (o mesmo do cubo); colunas internas do snapshot ficam de fora
+def _tabela(dados: pd.DataFrame) -> pd.DataFrame:
+    datas = dados['Data do frete']
+    return dados.drop(columns=[coluna for coluna in dados.columns if coluna.startswith('_')]).assign(
+        ano=datas.dt.year.astype('Int16'),
+        mes=datas.dt.month.astype('Int8'),
+        grupo=grupos_de(dados['Última Ocorrência']),
+    )
+
+
+def carregar(dados: pd.DataFrame, versao: str):
+    tabela = _tabela(dados)
+    with motor().begin() as conexao:
+        conexao.execute(text(f'DROP TABLE IF EXISTS {TABELA_CARGA}'))
+        tabela.to_sql(
+            TABELA_CARGA, conexao, index=False,
+            chunksize=TAMANHO_LOTE, method='multi', dtype=_tipos_sql(tabela),
+        )
+        for indice, colunas in INDICES.items():
+            if not set(colunas) <= set(tabela.columns):
+                continue
+            conexao.execute(text(f'CREATE INDEX {indice} ON {TABELA_CARGA} ({", ".join(map(_nome, colunas))})'))
+
+        # Troca atômica: quem consulta nunca vê a tabela pela metade
+        conexao.execute(text(f'CREATE TABLE IF NOT EXISTS {TABELA} LIKE {TABELA_CARGA}'))
+        conexao.execute(text(f'RENAME TABLE {TABELA} TO {TABELA_ANTERIOR}, {TABELA_CARGA} TO {TABELA}'))
+        conexao.execute(text(f'DROP TABLE {TABELA_ANTERIOR}'))
+
+        conexao.execute(text(f'CREATE TABLE IF NOT EXISTS {TABELA_VERSAO} (versao VARCHAR(32) NOT NULL)'))
+        conexao.execute(text(f'DELETE FROM {TABELA_VERSAO}'))
+        conexao.execute(text(f'INSERT INTO {TABELA_VERSAO} (versao) VALUES (:versao)'), {'versao': versao})
+
+
+def _consultar(sql: str, parametros: dict = None) -> pd.DataFrame:
+    with motor().connect() as conexao:
+        return pd.read_sql(text(sql), conexao, params=parametros)
+
+
+# Versão do snapshot carregada no banco (None se ainda não houve carga)
+def versao():
+    if not inspect(motor()).has_table(TABELA_VERSAO):
+        return None
+    resultado = _consultar(f'SELECT versao FROM {TABELA_VERSAO}')
+    return resultado['versao'].iloc[0] if len(resultado) else None
+
+
+def colunas() -> list:
+    return [
+        coluna['name'] for coluna in inspect(motor()).get_columns(TABELA)
+        if coluna['name'] not in COLUNAS_INTERNAS
+    ]
+
+
+# selecao: {dimensão: valor}, como no índice de filtros; dimensões ausentes
+# não filtram
+def _filtro(selecao: dict):
+    condicoes, parametros = [], {}
+    for i, (dimensao, valor) in enumerate(selecao.items()):
+        coluna = _nome(COLUNAS_FILTRO.get(dimensao, dimensao))
+        if isinstance(valor, Prefixo):
+            condicoes.append(f"{coluna} LIKE :p{i} ESCAPE '!'")
+            valor = re.sub(r'([!%_])', r'!\1', valor) + '%'
+        else:
+            condicoes.append(f'{coluna} = :p{i}')
+        parametros[f'p{i}'] = valor.item() if isinstance(valor, np.generic) else valor
+    return (' WHERE ' + ' AND '.join(condicoes) if condicoes else ''), parametros
+
+
+# Opções de um filtro da barra lateral
+def valores(dimensao: str) -> list:
+    coluna = _nome(COLUNAS_FILTRO[dimensao])
+    return _consultar(
+        f'SELECT DISTINCT {coluna} AS valor FROM {TABELA} WHERE {coluna} IS NOT NULL ORDER BY valor'
+    )['valor'].tolist()
+
+
+# Células do cubo (grupo x Aging) já filtradas e somadas no banco; vão direto
+# para cubo.resumir
+def celulas(selecao: dict) -> pd.DataFrame:
+    filtro, parametros = _filtro(selecao)
+    return _consultar(
+        f'SELECT grupo, {_nome("Aging")} AS Aging, COUNT(*) AS linhas, '
+        f'COALESCE(SUM({_nome("Nota Fiscal/Valor NF")}), 0) AS valor_nf '
+        f'FROM {TABELA}{filtro} GROUP BY grupo, {_nome("Aging")}',
+        parametros,
+    )
+
+
+def _selecionar(selecao: dict, colunas: list, distintas: bool):
+    filtro, parametros = _filtro(selecao)
+    return f'SELECT {"DISTINCT " if distintas else ""}{", ".join(map(_nome, colunas))} FROM {TABELA}{filtro}', parametros
+
+
+# Total de linhas de uma tabela da página, sem trazer as linhas
+def contar(selecao: dict, colunas: list, distintas: bool = False) -> int:
+    if distintas:
+        sql, parametros = _selecionar(selecao, colunas, distintas)
+        sql = f'SELECT COUNT(*) AS total FROM ({sql}) AS linhas'
+    else:
+        filtro, parametros = _filtro(selecao)
+        sql = f'SELECT COUNT(*) AS total FROM {TABELA}{filtro}'
+    return int(_consultar(sql, parametros)['total'].iloc[0])
+
+
+# Linhas de uma tabela da página: só as colunas pedidas, ordenadas no banco,
+# a partir de `deslocamento` e no máximo `limite`
+def linhas(selecao: dict, colunas: list, distintas: bool = False, limite: int = None,
+           deslocamento: int = 0, ordem: str = None, crescente: bool = True) -> pd.DataFrame:
+    sql, parametros = _selecionar(selecao, colunas, distintas)
+    if ordem is not None:
+        # Vazios por último nos dois sentidos, como na tabela em memória
+        sql += f' ORDER BY {_nome(ordem)} IS NULL, {_nome(ordem)} {"ASC" if crescente else "DESC"}'
+    if limite is not None:
+        sql += ' LIMIT :limite OFFSET :deslocamento'
+        parametros.update(limite=limite, deslocamento=deslocamento)
+    return _consultar(sql, parametros)
+
+
+if __name__ == '__main__':
+    import time
+
+    from snapshot import carregar_snapshot, ler_metadados
+
+    inicio = time.perf_counter()
+    carregar(carregar_snapshot(), ler_metadados().get('versao', 'local'))
+    print(f'carga: {time.perf_counter() - inicio:.2f}s')
+
+    for selecao in [{}, {'Aging': valores('Aging')[0]}, {'Cliente': valores('Cliente')[0], 'Ano': valores('Ano')[-1]}]:
+        inicio = time.perf_counter()
+        resultado = celulas(selecao)
+        print(f'{selecao}: {len(resultado)} células, {resultado["linhas"].sum()} linhas em {time.perf_counter() - inicio:.3f}s')
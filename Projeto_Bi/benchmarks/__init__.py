@@ -0,0 +1,17 @@
+# Benchmarks do painel (asv: https://asv.readthedocs.io).
+#
+#     pip install asv
+#     asv run                      # commits da branch, no ambiente do asv.conf.json
+#     asv run --python=same --quick  # só o código atual, no Python atual
+#     asv publish && asv preview   # histórico por commit
+#
+# Os relatórios são gerados por sintetico.py. BENCH_TAMANHOS escolhe os
+# tamanhos (padrão 10k,100k; 1M e 5M levam minutos por benchmark).
+import os
+import sys
+
+# Com --python=same os módulos do painel não estão instalados no ambiente
+try:
+    import config  # noqa: F401
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
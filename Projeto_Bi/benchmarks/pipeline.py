@@ -0,0 +1,159 @@
+# Tempo (e memória, na ingestão) de cada etapa, do relatório bruto às
+# métricas das abas, para relatórios sintéticos de vários tamanhos.
+import os
+
+import numpy as np
+
+import ingestao
+import sintetico
+import snapshot
+from aging import classificar_aging
+from atualizacao import Mesclagem
+from classificacao import classificar_clientes, classificar_degradacao, classificar_regional
+from compactacao import compactar
+from config import *
+from cubo import metricas
+from esquema import aplicar_esquema
+from fonte import FonteSnapshot
+from transformacoes import aplicar_derivadas
+
+TAMANHOS = [sintetico.tamanho(t) for t in os.environ.get('BENCH_TAMANHOS', '10k,100k').split(',')]
+
+# Listas de ocorrências das métricas de cada aba da página de Degradação
+LISTAS_ABAS = {
+    'Em Aberto': [ocorrencias_agendamento_em_aberto, ocorrencias_coleta_em_aberto, ocorrencia_devolucao_em_aberto],
+    'Insucesso': [ocorrencias_insucesso_de_agendamento, ocorrencia_insucesso_de_coleta, correncia_insucesso_de_devolucao],
+    'Relatório': [
+        ocorrencias_agendamento_em_aberto, ocorrencias_coleta_em_aberto, aguardando_check_list,
+        ocorrencias_insucesso_de_agendamento, coleta_em_aberto, ocorrencia_insucesso_de_coleta,
+        devolvido, correncia_insucesso_de_devolucao, pendecia,
+    ],
+}
+
+
+class Ingestao:
+    params = TAMANHOS
+    param_names = ['linhas']
+    timeout = 1800
+
+    # Um .csv por tamanho, gerado uma vez para todos os benchmarks da classe
+    def setup_cache(self):
+        caminhos = {}
+        for linhas in TAMANHOS:
+            caminhos[linhas] = os.path.abspath(f'relatorio-{linhas}.csv')
+            sintetico.gravar_csv(caminhos[linhas], linhas)
+        return caminhos
+
+    def _ingerir(self, caminhos, linhas):
+        with open(caminhos[linhas], 'rb') as arquivo:
+            for _ in Mesclagem().blocos(ingestao.ler_blocos(arquivo, 'csv')):
+                pass
+
+    def time_ingestao(self, caminhos, linhas):
+        self._ingerir(caminhos, linhas)
+
+    def peakmem_ingestao(self, caminhos, linhas):
+        self._ingerir(caminhos, linhas)
+
+
+class Classificacao:
+    params = TAMANHOS
+    param_names = ['linhas']
+    timeout = 600
+
+    def setup(self, linhas):
+        self.bruto = sintetico.gerar(linhas)
+        self.dados = aplicar_esquema(self.bruto.copy())
+
+    def time_clientes(self, linhas):
+        classificar_clientes(self.dados['Pagador do frete/Documento'], self.dados['Frete/N° Referência'], clientes)
+
+    def time_aging(self, linhas):
+        classificar_aging(self.dados['Data Última Ocorrência'])
+
+    def time_degradacao(self, linhas):
+        classificar_degradacao(self.dados['Última Ocorrência'])
+
+    def time_regional(self, linhas):
+        classificar_regional(self.dados['Agente de Coleta'])
+
+    # Esquema + todas as derivadas, como em cada bloco da ingestão
+    def time_derivadas(self, linhas):
+        aplicar_derivadas(self.bruto.copy())
+
+
+# Leitura da forma das páginas: Parquet + compactação x Arrow mapeado
+class LeituraSnapshot:
+    params = TAMANHOS
+    param_names = ['linhas']
+    timeout = 1800
+
+    def setup_cache(self):
+        caminhos = {}
+        for linhas in TAMANHOS:
+            dados = compactar(aplicar_derivadas(sintetico.gerar(linhas)))
+            caminhos[linhas] = {formato: os.path.abspath(f'snapshot-{linhas}.{formato}') for formato in ['parquet', 'arrow']}
+            snapshot.gravar_snapshot(dados, caminhos[linhas]['parquet'])
+            snapshot.gravar_arrow(dados, caminhos[linhas]['arrow'])
+        return caminhos
+
+    def time_parquet(self, caminhos, linhas):
+        snapshot.ler_snapshot(caminhos[linhas]['parquet'])
+
+    def peakmem_parquet(self, caminhos, linhas):
+        snapshot.ler_snapshot(caminhos[linhas]['parquet'])
+
+    def time_arrow(self, caminhos, linhas):
+        snapshot.ler_arrow(caminhos[linhas]['arrow'])
+
+    def peakmem_arrow(self, caminhos, linhas):
+        snapshot.ler_arrow(caminhos[linhas]['arrow'])
+
+
+class Painel:
+    params = TAMANHOS
+    param_names = ['linhas']
+    timeout = 1800
+
+    # O relatório como a página o lê do snapshot: classificado e compactado
+    def setup_cache(self):
+        return {linhas: compactar(aplicar_derivadas(sintetico.gerar(linhas))) for linhas in TAMANHOS}
+
+    def setup(self, dados, linhas):
+        self.dados = dados[linhas]
+        self.fonte = FonteSnapshot(self.dados)
+        cliente = self.fonte.valores('Cliente')[0]
+        ano = max(self.fonte.valores('Ano'))
+        self.selecoes = [
+            {},
+            {'Aging': '> 60 dias'},
+            {'Cliente': cliente, 'Ano': ano},
+            {'Cliente': cliente, 'Ano': ano, 'Mês': 1, 'Degradação': 'Pendência'},
+        ]
+        self.resultado = self.fonte.resultado(self.selecoes[2])
+
+    # Índice dos filtros, cubo e índices da busca (uma vez por versão)
+    def time_montar_fonte(self, dados, linhas):
+        FonteSnapshot(self.dados)
+
+    def time_filtrar(self, dados, linhas):
+        for selecao in self.selecoes:
+            self.fonte.indice.filtrar(selecao)
+
+    # Filtro + métricas do cubo, o que cada seleção nova custa
+    def time_resultado(self, dados, linhas):
+        for selecao in self.selecoes:
+            self.fonte.resultado(selecao)
+
+    def time_metricas_abas(self, dados, linhas):
+        for listas in LISTAS_ABAS.values():
+            for lista in listas:
+                metricas(self.resultado['resumo'], lista)
+
+    def time_pagina_ordenada(self, dados, linhas):
+        colunas = ['Degradação', 'N° Minuta', 'Aging', 'Nota Fiscal/Valor NF']
+        self.fonte.linhas(colunas, self.resultado).pagina(0, 50, 'Nota Fiscal/Valor NF', False)
+
+    def time_busca(self, dados, linhas):
+        self.fonte.buscar('Referência', 'REF0000012')
+        self.fonte.buscar('N° Minuta', str(int(np.nanmax(self.dados['N° Minuta']))))
@@ -0,0 +1,61 @@
+# Busca de um frete pela barra lateral.
+#
+# Os campos de busca (campos_busca do config) são colunas de identificadores
+# do relatório. Para cada uma o índice de identificadores é montado uma vez
+# por versão, junto com a fonte: minuta (e demais colunas_inteiras) é
+# buscada pelo valor exato numa tabela hash; referência, NF e CNPJ, pelo
+# começo do texto, em valores ordenados. Nenhuma busca varre o relatório.
+import re
+
+import numpy as np
+import pandas as pd
+
+from config import campos_busca, colunas_inteiras
+from filtros import IndiceIdentificador
+
+# Colunas do resultado, além da buscada; as que não existem no relatório
+# são ignoradas
+COLUNAS_RESULTADO = [
+    'N° Minuta', 'Frete/N° Referência', 'Pagador do frete/Documento', 'Cliente', 'Data do frete',
+    'Última Ocorrência', 'Degradação', 'Aging', 'Regional', 'Nota Fiscal/Valor NF',
+]
+
+# Documentos são gravados só com os dígitos
+COLUNAS_DOCUMENTO = ['Pagador do frete/Documento']
+
+
+def campos_disponiveis(colunas: list) -> dict:
+    return {campo: coluna for campo, coluna in campos_busca.items() if coluna in colunas}
+
+
+def colunas_resultado(coluna: str, colunas: list) -> list:
+    return [c for c in dict.fromkeys([coluna] + COLUNAS_RESULTADO) if c in colunas]
+
+
+# Termo digitado -> valor buscado na coluna (None se não pode existir)
+def termo_da_busca(coluna: str, texto: str):
+    texto = texto.strip()
+    if coluna in colunas_inteiras:
+        return int(texto) if texto.isdigit() else None
+    if coluna in COLUNAS_DOCUMENTO:
+        texto = re.sub(r'\D', '', texto)
+    return texto or None
+
+
+def busca_exata(coluna: str) -> bool:
+    return coluna in colunas_inteiras
+
+
+class IndiceBusca:
+    def __init__(self, dados: pd.DataFrame):
+        self.campos = campos_disponiveis(dados.columns)
+        self.indices = {coluna: IndiceIdentificador(dados[coluna]) for coluna in self.campos.values()}
+
+    # Posições (em ordem crescente) das linhas encontradas
+    def buscar(self, campo: str, texto: str) -> np.ndarray:
+        coluna = self.campos[campo]
+        termo = termo_da_busca(coluna, texto)
+        if termo is None:
+            return np.array([], dtype=np.intp)
+        indice = self.indices[coluna]
+        return np.sort(indice.posicoes(termo) if busca_exata(coluna) else indice.prefixo(termo))
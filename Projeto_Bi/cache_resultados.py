@@ -0,0 +1,77 @@
+# Cache LRU de resultados compartilhado entre sessões.
+#
+# A chave é a versão do snapshot + a seleção da barra lateral; o valor é o
+# que foi calculado para ela (posições filtradas, métricas, gráficos...).
+# O limite é em bytes: os itens usados há mais tempo saem primeiro quando o
+# total estimado passa do limite.
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# Estimativa do espaço ocupado por um resultado
+def tamanho_em_bytes(valor) -> int:
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        uso = valor.memory_usage(deep=True)
+        return int(uso.sum()) if isinstance(valor, pd.DataFrame) else int(uso)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamanho_em_bytes(k) + tamanho_em_bytes(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(tamanho_em_bytes(item) for item in valor)
+    if hasattr(valor, 'to_plotly_json'):
+        # Figura do Plotly: o tamanho da especificação serializada
+        return len(valor.to_json())
+    return sys.getsizeof(valor)
+
+
+def chave_selecao(versao: str, selecao: dict) -> tuple:
+    return (versao,) + tuple(sorted(selecao.items()))
+
+
+class CacheLRU:
+    def __init__(self, limite_bytes: int):
+        self.limite_bytes = limite_bytes
+        self.bytes = 0
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self._itens)
+
+    # Devolve o valor da chave; se não houver, calcula (fora da trava, para
+    # não segurar as outras sessões) e guarda
+    def obter(self, chave, calcular):
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave][0]
+            self.falhas += 1
+
+        valor = calcular()
+        tamanho = tamanho_em_bytes(valor)
+
+        with self._trava:
+            if chave not in self._itens:
+                self._itens[chave] = (valor, tamanho)
+                self.bytes += tamanho
+            self._despejar()
+        return valor
+
+    # Remove os menos usados até caber no limite (o mais recente sempre fica)
+    def _despejar(self):
+        while self.bytes > self.limite_bytes and len(self._itens) > 1:
+            _, (_, tamanho) = self._itens.popitem(last=False)
+            self.bytes -= tamanho
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self.bytes = 0
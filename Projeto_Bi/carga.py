@@ -0,0 +1,306 @@
+# Teste de carga do painel: N sessões simultâneas num servidor Streamlit.
+#
+#     python carga.py [--sessoes 1,5,10,20] [--interacoes 20] [--linhas 100k]
+#                     [--pagina todas|degradacao|monitor] [--json resultado.json]
+#     python carga.py --url http://pod:8501 ...   # servidor já no ar
+#
+# Sem --url, o relatório sintético (sintetico.py) é publicado numa pasta de
+# snapshot própria, dados/carga/<linhas> (reaproveitada entre execuções), e
+# um `streamlit run` é iniciado apontado para ela (DASHBOARD_DIR_SNAPSHOT).
+# Cada sessão é um cliente do websocket do Streamlit, como o navegador:
+# manda o rerun com o estado dos widgets e espera o fim do script. A sessão
+# abre a página, passa por todas as abas da Degradação e depois faz
+# `interacoes` cliques ao acaso nos filtros da barra lateral, nas abas ou
+# nas colunas do Monitor; cada clique é um rerun cronometrado, do envio ao
+# fim do script, incluindo a serialização das mensagens.
+#
+# Para cada número de sessões: latência do rerun (p50/p95/p99), reruns por
+# segundo, erros (exceções na página) e memória (RSS) do servidor
+# acrescentada por sessão aberta (só com o servidor iniciado aqui).
+#
+# A pasta de snapshot é dada como conferida com o servidor do RPA no início;
+# execuções mais longas que intervalo_verificacao_min fazem a thread de
+# atualização do painel consultar o servidor.
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import psutil
+import requests
+import streamlit
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.websocket import websocket_connect
+
+DIR_BASE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = 'Degradação.py'
+# Página -> nome dela na URL ('' = página principal)
+PAGINAS = {
+    'degradacao': '',
+    'monitor': 'Monitor_Geração_a_Faturamento',
+}
+WIDGETS = ['selectbox', 'radio', 'multiselect', 'checkbox']
+SIDEBAR = 1  # delta_path[0] dos elementos da barra lateral
+MB = 1024 * 1024
+
+# Até a 1.44 selectbox e multiselect mandam o índice da opção escolhida e
+# até a 1.52 o radio também; nas seguintes, o texto da opção
+VERSAO_STREAMLIT = tuple(int(parte) for parte in streamlit.__version__.split('.')[:2])
+SELECAO_POR_TEXTO = VERSAO_STREAMLIT >= (1, 45)
+RADIO_POR_TEXTO = VERSAO_STREAMLIT >= (1, 53)
+
+
+# Publica o relatório sintético como versão vigente da pasta de snapshot
+# (só quando ela não tem um snapshot do dia, no formato atual) e o marca
+# como conferido agora.
+# Os módulos do painel são importados aqui, depois de DASHBOARD_DIR_SNAPSHOT
+# definido
+def preparar(linhas: int, semente: int = 0) -> str:
+    import ingestao
+    import sintetico
+    import snapshot
+    from atualizacao import VERSAO_FORMATO, Mesclagem, publicar_blocos
+
+    metadados = snapshot.ler_metadados()
+    hoje = datetime.now().date().isoformat()
+    if (not snapshot.existe_snapshot() or metadados.get('data_referencia') != hoje
+            or metadados.get('formato') != VERSAO_FORMATO):
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, sintetico.nome_arquivo('csv'))
+            sintetico.gravar_csv(caminho, linhas, semente)
+            with open(caminho, 'rb') as arquivo:
+                blocos = Mesclagem().blocos(ingestao.ler_blocos(arquivo, 'csv'))
+                metadados = publicar_blocos(blocos, url=f'sintetico:{linhas}:{semente}')
+    snapshot.gravar_metadados({**metadados, 'verificado_em': datetime.now().isoformat()})
+    return metadados['versao']
+
+
+def iniciar_servidor(porta: int, log) -> subprocess.Popen:
+    servidor = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', SCRIPT, '--server.port', str(porta),
+         '--server.headless', 'true', '--browser.gatherUsageStats', 'false'],
+        cwd=DIR_BASE, env=os.environ.copy(), stdout=log, stderr=subprocess.STDOUT,
+    )
+    url = f'http://localhost:{porta}'
+    for _ in range(120):
+        if servidor.poll() is not None:
+            raise RuntimeError(f'O servidor saiu com código {servidor.returncode}')
+        try:
+            if requests.get(f'{url}/_stcore/health', timeout=1).ok:
+                return servidor
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    servidor.terminate()
+    raise TimeoutError('O servidor não respondeu em 120 s')
+
+
+def _estado(widget: dict, valor) -> WidgetState:
+    estado = WidgetState(id=widget['id'])
+    tipo, opcoes = widget['tipo'], widget['opcoes']
+    if tipo == 'checkbox':
+        estado.bool_value = valor
+    elif tipo == 'multiselect' and SELECAO_POR_TEXTO:
+        estado.string_array_value.data.extend(valor)
+    elif tipo == 'multiselect':
+        estado.int_array_value.data.extend(opcoes.index(v) for v in valor)
+    elif (tipo == 'selectbox' and SELECAO_POR_TEXTO) or (tipo == 'radio' and RADIO_POR_TEXTO):
+        estado.string_value = valor
+    else:
+        estado.int_value = opcoes.index(valor)
+    return estado
+
+
+class Sessao:
+    def __init__(self, url: str, pagina: str, semente: int, timeout: float):
+        self.url = url.replace('http', 'ws', 1).rstrip('/') + '/_stcore/stream'
+        self.pagina = pagina
+        self.rng = random.Random(semente)
+        self.timeout = timeout
+        self.conexao = None
+        self.widgets = {}  # id -> tipo, rótulo, opções, barra lateral
+        self.estados = {}  # id -> WidgetState enviado
+        self.latencias = []
+        self.erros = 0
+
+    async def _ler_execucao(self):
+        widgets = {}
+        while True:
+            dados = await self.conexao.read_message()
+            if dados is None:
+                raise ConnectionError('O servidor fechou o websocket')
+            mensagem = ForwardMsg()
+            mensagem.ParseFromString(dados)
+            tipo = mensagem.WhichOneof('type')
+            if tipo == 'delta' and mensagem.delta.WhichOneof('type') == 'new_element':
+                elemento = mensagem.delta.new_element
+                tipo_elemento = elemento.WhichOneof('type')
+                if tipo_elemento == 'exception':
+                    self.erros += 1
+                elif tipo_elemento in WIDGETS:
+                    widget = getattr(elemento, tipo_elemento)
+                    widgets[widget.id] = {
+                        'id': widget.id,
+                        'tipo': tipo_elemento,
+                        'rotulo': widget.label,
+                        'opcoes': list(getattr(widget, 'options', [])),
+                        'sidebar': mensagem.metadata.delta_path[:1] == [SIDEBAR],
+                    }
+            elif tipo == 'script_finished':
+                self.widgets = widgets
+                # Widgets que sumiram (ex.: o Ano com "todos os anos") não são reenviados
+                self.estados = {id: estado for id, estado in self.estados.items() if id in widgets}
+                return
+
+    async def _rerun(self):
+        # A página vai sempre pelo nome da URL, como na primeira carga do navegador
+        mensagem = BackMsg()
+        mensagem.rerun_script.page_name = PAGINAS[self.pagina]
+        mensagem.rerun_script.widget_states.widgets.extend(self.estados.values())
+        inicio = time.perf_counter()
+        try:
+            await self.conexao.write_message(mensagem.SerializeToString(), binary=True)
+            await asyncio.wait_for(self._ler_execucao(), self.timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.erros += 1
+        self.latencias.append(time.perf_counter() - inicio)
+
+    async def abrir(self):
+        self.conexao = await websocket_connect(self.url, subprotocols=['streamlit'], max_message_size=1024 * MB)
+        await self._rerun()
+
+    def fechar(self):
+        if self.conexao is not None:
+            self.conexao.close()
+
+    async def _clicar(self, widget: dict, valor):
+        self.estados[widget['id']] = _estado(widget, valor)
+        await self._rerun()
+
+    def _clicaveis(self) -> list:
+        return [
+            w for w in self.widgets.values()
+            if w['tipo'] == 'checkbox' or (w['opcoes'] and (w['sidebar'] or w['tipo'] != 'selectbox'))
+        ]
+
+    async def interagir(self, interacoes: int):
+        abas = [w for w in self.widgets.values() if w['tipo'] == 'radio' and w['rotulo'] == 'Aba']
+        if abas:
+            for aba in abas[0]['opcoes']:
+                await self._clicar(abas[0], aba)
+        for _ in range(interacoes):
+            widgets = self._clicaveis()
+            if not widgets:
+                await self._rerun()
+                continue
+            widget = self.rng.choice(widgets)
+            if widget['tipo'] == 'checkbox':
+                valor = not (widget['id'] in self.estados and self.estados[widget['id']].bool_value)
+            elif widget['tipo'] == 'multiselect':
+                valor = self.rng.sample(widget['opcoes'], self.rng.randint(1, min(8, len(widget['opcoes']))))
+            else:
+                valor = self.rng.choice(widget['opcoes'])
+            await self._clicar(widget, valor)
+
+
+def _rss_mb(servidor: subprocess.Popen) -> float:
+    if servidor is None:
+        return np.nan
+    return psutil.Process(servidor.pid).memory_info().rss / MB
+
+
+# Uma rodada com n sessões; a memória por sessão é medida depois de todas
+# abrirem a página (os caches já estão quentes pelo aquecimento)
+async def rodada(url: str, servidor, n: int, paginas: list, interacoes: int, semente: int, timeout: float) -> dict:
+    sessoes = [Sessao(url, paginas[i % len(paginas)], semente + i, timeout) for i in range(n)]
+    antes = _rss_mb(servidor)
+    inicio = time.perf_counter()
+    try:
+        await asyncio.gather(*(sessao.abrir() for sessao in sessoes))
+        abertas = _rss_mb(servidor)
+        await asyncio.gather(*(sessao.interagir(interacoes) for sessao in sessoes))
+        duracao = time.perf_counter() - inicio
+    finally:
+        for sessao in sessoes:
+            sessao.fechar()
+
+    latencias = np.array([l for sessao in sessoes for l in sessao.latencias]) * 1000
+    return {
+        'sessoes': n,
+        'reruns': len(latencias),
+        'erros': sum(sessao.erros for sessao in sessoes),
+        'rerun_p50_ms': np.percentile(latencias, 50),
+        'rerun_p95_ms': np.percentile(latencias, 95),
+        'rerun_p99_ms': np.percentile(latencias, 99),
+        'reruns_por_s': len(latencias) / duracao,
+        'mb_por_sessao': (abertas - antes) / n,
+        'rss_servidor_mb': _rss_mb(servidor),
+    }
+
+
+async def executar(url: str, servidor, args) -> list:
+    paginas = list(PAGINAS) if args.pagina == 'todas' else [args.pagina]
+    # Aquecimento: carrega snapshot, índices e caches uma vez, fora da medição
+    for pagina in paginas:
+        sessao = Sessao(url, pagina, args.semente, args.timeout)
+        await sessao.abrir()
+        sessao.fechar()
+
+    resultados = []
+    for n in [int(n) for n in args.sessoes.split(',')]:
+        resultados.append(await rodada(url, servidor, n, paginas, args.interacoes, args.semente, args.timeout))
+        print(pd.DataFrame(resultados).round(1).to_string(index=False), end='\n\n')
+        await asyncio.sleep(1)  # o servidor encerra as sessões fechadas
+    return resultados
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(prog='python carga.py', description='Teste de carga com sessões simultâneas do painel.')
+    parser.add_argument('--sessoes', default='1,5,10,20', help='números de sessões simultâneas, separados por vírgula')
+    parser.add_argument('--interacoes', type=int, default=20, help='cliques por sessão, além da volta pelas abas')
+    parser.add_argument('--linhas', default='100k', help='tamanho do relatório sintético (ex.: 10k, 100k, 1M)')
+    parser.add_argument('--pagina', choices=['todas', *PAGINAS], default='todas')
+    parser.add_argument('--url', help='servidor já no ar (sem dados sintéticos nem medida de memória)')
+    parser.add_argument('--porta', type=int, default=8599, help='porta do servidor iniciado aqui')
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=300, help='segundos máximos de um rerun')
+    parser.add_argument('--json', help='grava o resultado neste arquivo')
+    args = parser.parse_args(argumentos)
+
+    servidor = None
+    if args.url is None:
+        pasta = os.path.join(DIR_BASE, 'dados', 'carga', args.linhas)
+        os.environ['DASHBOARD_DIR_SNAPSHOT'] = pasta
+        import sintetico
+
+        print(f'Snapshot sintético de {args.linhas} linhas em {pasta}')
+        preparar(sintetico.tamanho(args.linhas), args.semente)
+        log = open(os.path.join(pasta, 'servidor.log'), 'w', encoding='utf-8')
+        servidor = iniciar_servidor(args.porta, log)
+        args.url = f'http://localhost:{args.porta}'
+
+    try:
+        resultados = asyncio.run(executar(args.url, servidor, args))
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.wait()
+            log.close()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
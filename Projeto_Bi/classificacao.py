@@ -0,0 +1,128 @@
+# Classificação de Cliente, Degradação e Regional por tabelas de lookup.
+#
+# As listas do config são compiladas uma única vez, na importação, em
+# dicionários ocorrência -> categoria e agente -> regional; as raízes de CNPJ
+# dos clientes viram um dicionário raiz -> cliente. A classificação de uma
+# coluna inteira é feita sobre os valores distintos e devolvida como
+# Categorical.
+import numpy as np
+import pandas as pd
+
+from config import *
+
+# Ordem de prioridade: a primeira lista que contém a ocorrência define a
+# categoria, igual à sequência de elif do antigo degradacao()
+PRIORIDADE_DEGRADACAO = [
+    ('Agendamento em Aberto', ocorrencias_agendamento_em_aberto),
+    ('Aguardando Check List', aguardando_check_list),
+    ('Cancelado/ Finalizado', cancelado_finalizado),
+    ('Coleta em Aberto', coleta_em_aberto),
+    ('Devolução em Aberto', devolucao_em_aberto),
+    ('Devolvido', devolvido),
+    ('Entrega em Aberto', entrega_em_aberto),
+    ('Insucesso de Agendamento', ocorrencias_insucesso_de_agendamento),
+    ('Insucesso de Devolução', correncia_insucesso_de_devolucao),
+    ('Outros', outros),
+    ('Pendência', pendecia),
+    ('Insucesso de Coleta', ocorrencia_insucesso_de_coleta),
+]
+
+PRIORIDADE_REGIONAL = [
+    ('Regional GRU', regional_GRU),
+    ('Regional RJO', regional_RJO),
+    ('Regional BHZ', regional_BHZ),
+    ('Regional BR', regional_BR),
+]
+
+DEGRADACAO_DESCONHECIDA = 'Desconhecido'
+
+CATEGORIAS_DEGRADACAO = [categoria for categoria, _ in PRIORIDADE_DEGRADACAO]
+CATEGORIAS_REGIONAL = [categoria for categoria, _ in PRIORIDADE_REGIONAL]
+
+TIPO_DEGRADACAO = pd.CategoricalDtype(CATEGORIAS_DEGRADACAO + [DEGRADACAO_DESCONHECIDA])
+TIPO_REGIONAL = pd.CategoricalDtype(CATEGORIAS_REGIONAL)
+
+
+def _compilar(prioridade: list) -> dict:
+    mapa = {}
+    for categoria, valores in prioridade:
+        for valor in valores:
+            mapa.setdefault(valor, categoria)
+    return mapa
+
+
+MAPA_DEGRADACAO = _compilar(PRIORIDADE_DEGRADACAO)
+MAPA_REGIONAL = _compilar(PRIORIDADE_REGIONAL)
+
+
+# Cada valor distinto é procurado uma vez no dicionário; as linhas só
+# recebem o código da categoria correspondente
+def _classificar(serie: pd.Series, mapa: dict, tipo: pd.CategoricalDtype, padrao: str = None) -> pd.Series:
+    codigos, valores = pd.factorize(serie)
+    codigos_categoria = pd.Categorical(pd.Index(valores).map(mapa), dtype=tipo).codes
+
+    sem_categoria = -1 if padrao is None else tipo.categories.get_loc(padrao)
+    codigos_categoria = np.where(codigos_categoria == -1, sem_categoria, codigos_categoria)
+    resultado = np.where(codigos == -1, sem_categoria, codigos_categoria[codigos])
+
+    return pd.Series(
+        pd.Categorical.from_codes(resultado.astype('int8'), dtype=tipo),
+        index=serie.index,
+    )
+
+
+def classificar_degradacao(ultima_ocorrencia: pd.Series) -> pd.Series:
+    return _classificar(ultima_ocorrencia, MAPA_DEGRADACAO, TIPO_DEGRADACAO, DEGRADACAO_DESCONHECIDA)
+
+
+# Agentes fora das listas regional_* ficam sem regional (vazio)
+def classificar_regional(agente_de_coleta: pd.Series) -> pd.Series:
+    return _classificar(agente_de_coleta, MAPA_REGIONAL, TIPO_REGIONAL)
+
+
+# Ocorrências que não estão em nenhuma lista do config (e por isso viram
+# 'Desconhecido'), com a quantidade de linhas de cada uma
+def ocorrencias_nao_mapeadas(ultima_ocorrencia: pd.Series) -> pd.Series:
+    ocorrencias = ultima_ocorrencia.dropna()
+    return ocorrencias[~ocorrencias.isin(list(MAPA_DEGRADACAO))].value_counts()
+
+
+CLIENTE_OUTROS = 'OUTROS'
+CLIENTE_MULTI_B2B = 'MULTI B2B'
+
+
+# Raiz de CNPJ -> posição do cliente na lista. Se a mesma raiz aparece mais
+# de uma vez, vale a última, como no loop do antigo define_clientes_df
+def compilar_raizes(clientes: list) -> dict:
+    return {cliente['raiz_cnpj']: posicao for posicao, cliente in enumerate(clientes)}
+
+
+def tipo_cliente(clientes: list) -> pd.CategoricalDtype:
+    nomes = [cliente['nome'] for cliente in clientes]
+    return pd.CategoricalDtype(pd.unique(pd.Series(nomes + [CLIENTE_MULTI_B2B, CLIENTE_OUTROS])))
+
+
+# Cada documento distinto é cortado uma vez em cada tamanho de raiz do config
+# (8 dígitos, 14 para ASTRA SA...) e procurado no dicionário. Quando mais de
+# uma raiz casa, vence o cliente mais abaixo na lista, que era quem
+# sobrescrevia os anteriores no loop com np.where.
+def classificar_clientes(documentos: pd.Series, referencias: pd.Series, clientes: list) -> pd.Series:
+    raizes = compilar_raizes(clientes)
+    tipo = tipo_cliente(clientes)
+
+    codigos, valores = pd.factorize(documentos.fillna('').astype(str))
+    valores = pd.Index(valores, dtype=object)
+    posicao = np.full(len(valores), -1)
+    for tamanho in sorted({len(raiz) for raiz in raizes}):
+        encontrados = valores.str[:tamanho].map(raizes)
+        posicao = np.maximum(posicao, np.nan_to_num(encontrados.to_numpy(dtype='float64'), nan=-1).astype(int))
+
+    # Posição -1 (nenhuma raiz casou) pega o último elemento: OUTROS
+    codigo_por_posicao = np.array([tipo.categories.get_loc(cliente['nome']) for cliente in clientes] + [tipo.categories.get_loc(CLIENTE_OUTROS)])
+    resultado = codigo_por_posicao[posicao][codigos]
+
+    multi_b2c = np.flatnonzero(tipo.categories.str.startswith('MULTI B2C'))
+    b2b = np.isin(resultado, multi_b2c) & referencias.str.contains('B2B', na=False).to_numpy(dtype=bool)
+    resultado[b2b] = tipo.categories.get_loc(CLIENTE_MULTI_B2B)
+
+    return pd.Series(pd.Categorical.from_codes(resultado.astype('int16'), dtype=tipo), index=documentos.index)
@@ -0,0 +1,80 @@
+# Representação compacta do relatório em memória.
+#
+# Na leitura do snapshot: colunas com poucos valores distintos viram category,
+# texto livre vira string do Arrow, identificadores numéricos viram inteiros
+# (nullable) do menor tamanho que cabe e as colunas que nenhuma página usa
+# são descartadas. `python compactacao.py` mostra o uso de memória por coluna
+# do snapshot atual, antes e depois.
+import numpy as np
+import pandas as pd
+
+from config import colunas_inteiras, colunas_descartadas
+
+# Texto com até esta fração de valores distintos vira category
+FRACAO_CATEGORIA = 0.5
+
+TIPO_TEXTO = pd.StringDtype('pyarrow')
+
+
+def inteiro_compacto(serie: pd.Series) -> pd.Series:
+    numeros = pd.to_numeric(serie, errors='coerce')
+    validos = numeros.dropna()
+    # Se algum valor não é número inteiro, a coluna fica como está
+    if numeros.notna().sum() != serie.notna().sum() or (validos % 1 != 0).any():
+        return serie
+    if validos.empty or validos.abs().max() < np.iinfo('int32').max:
+        return numeros.astype('Int32')
+    return numeros.astype('Int64')
+
+
+def _texto_compacto(serie: pd.Series) -> pd.Series:
+    distintos = serie.nunique(dropna=True)
+    if len(serie) and distintos <= FRACAO_CATEGORIA * len(serie):
+        return serie.astype('category')
+    return serie.astype(TIPO_TEXTO)
+
+
+def compactar(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.drop(columns=[coluna for coluna in colunas_descartadas if coluna in df.columns])
+    for coluna in colunas_inteiras:
+        if coluna in df.columns:
+            df[coluna] = inteiro_compacto(df[coluna])
+    for coluna in df.columns:
+        if df[coluna].dtype == object or isinstance(df[coluna].dtype, pd.StringDtype):
+            df[coluna] = _texto_compacto(df[coluna])
+    return df
+
+
+# Bytes por coluna antes e depois da compactação (memory_usage deep)
+def relatorio_memoria(antes: pd.DataFrame, depois: pd.DataFrame) -> pd.DataFrame:
+    relatorio = pd.DataFrame({
+        'antes': antes.memory_usage(index=False, deep=True),
+        'depois': depois.memory_usage(index=False, deep=True),
+        'tipo_antes': antes.dtypes.astype(str),
+        'tipo_depois': depois.dtypes.astype(str),
+    })
+    relatorio.loc['TOTAL', ['antes', 'depois']] = relatorio[['antes', 'depois']].sum()
+    relatorio['reducao_%'] = (1 - relatorio['depois'] / relatorio['antes']) * 100
+    return relatorio
+
+
+# Snapshot na forma em que era mantido antes da compactação: texto e
+# categorias como object, identificadores como float
+def expandir(df: pd.DataFrame) -> pd.DataFrame:
+    expandido = df.copy()
+    for coluna in expandido.columns:
+        tipo = expandido[coluna].dtype
+        if isinstance(tipo, (pd.CategoricalDtype, pd.StringDtype)):
+            expandido[coluna] = expandido[coluna].astype(object)
+        elif pd.api.types.is_extension_array_dtype(tipo) and pd.api.types.is_integer_dtype(tipo):
+            expandido[coluna] = expandido[coluna].astype('float64')
+    return expandido
+
+
+if __name__ == '__main__':
+    from snapshot import carregar_snapshot
+
+    dados = carregar_snapshot()
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', None)
+    print(relatorio_memoria(expandir(dados), compactar(dados.copy())))
@@ -0,0 +1,172 @@
+# Relatório de agendamento num DuckDB embutido no processo.
+#
+# Com backend_dados = 'duckdb' a página de Degradação não monta o relatório
+# em pandas: a cada versão o snapshot Parquet é carregado numa tabela do
+# DuckDB em memória (colunar e comprimida) e as classificações do config.py
+# entram no banco: as listas de ocorrências (cubo.LISTAS_METRICAS) como a
+# tabela `grupos_ocorrencia` e as faixas de Aging, Degradação e Regional
+# como tipos ENUM, que ordenam como as categorias do snapshot. Filtros da
+# barra lateral, métricas das abas e as tabelas paginadas são SQL
+# parametrizado, executado em paralelo pelo DuckDB, e as páginas recebem só o
+# resultado pequeno. A interface é a mesma do banco.py (MariaDB).
+# `python consultas.py` carrega o snapshot atual e mede as consultas das abas.
+import os
+import threading
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import snapshot
+from aging import TIPO_AGING
+from banco import Prefixo
+from classificacao import TIPO_DEGRADACAO, TIPO_REGIONAL
+from cubo import GRUPO_POR_OCORRENCIA
+
+TABELA = 'agendamento'
+TABELA_GRUPOS = 'grupos_ocorrencia'
+
+# Colunas classificadas -> categorias (na ordem de exibição) do ENUM
+TIPOS_ENUM = {'Aging': TIPO_AGING, 'Degradação': TIPO_DEGRADACAO, 'Regional': TIPO_REGIONAL}
+
+# Dimensão da seleção -> expressão SQL; as demais chaves da seleção são o
+# próprio nome da coluna (busca)
+COLUNAS_FILTRO = {
+    'Ano': 'year("Data do frete")',
+    'Mês': 'month("Data do frete")',
+}
+
+
+def _nome(coluna: str) -> str:
+    return '"' + coluna.replace('"', '""') + '"'
+
+
+def _texto(valor: str) -> str:
+    return "'" + str(valor).replace("'", "''") + "'"
+
+
+class Consultas:
+    # Uma conexão (e um banco em memória) por versão do snapshot; cada
+    # consulta usa o seu cursor, então as sessões consultam em paralelo
+    def __init__(self, versao: str = None):
+        caminho = snapshot.caminho_snapshot(versao)
+        self._colunas = [nome for nome in pq.read_schema(caminho).names if not nome.startswith('_')]
+        self.conexao = duckdb.connect()
+        selecionadas = []
+        for coluna in self._colunas:
+            if coluna in TIPOS_ENUM:
+                tipo = f'enum_{len(selecionadas)}'
+                categorias = ', '.join(map(_texto, TIPOS_ENUM[coluna].categories))
+                self.conexao.execute(f'CREATE TYPE {tipo} AS ENUM ({categorias})')
+                selecionadas.append(f'CAST({_nome(coluna)} AS {tipo}) AS {_nome(coluna)}')
+            else:
+                selecionadas.append(_nome(coluna))
+        self.conexao.execute(
+            f'CREATE TABLE {TABELA} AS SELECT {", ".join(selecionadas)} FROM read_parquet($caminho)',
+            {'caminho': caminho},
+        )
+        grupos = pd.DataFrame({
+            'ocorrencia': list(GRUPO_POR_OCORRENCIA),
+            'grupo': np.array(list(GRUPO_POR_OCORRENCIA.values()), dtype='int32'),
+        })
+        self.conexao.register('grupos_df', grupos)
+        self.conexao.execute(f'CREATE TABLE {TABELA_GRUPOS} AS SELECT * FROM grupos_df')
+        self.conexao.unregister('grupos_df')
+        self._trava = threading.Lock()
+
+    def _consultar(self, sql: str, parametros: dict = None) -> pd.DataFrame:
+        with self._trava:
+            cursor = self.conexao.cursor()
+        try:
+            return cursor.execute(sql, parametros or {}).df()
+        finally:
+            cursor.close()
+
+    def colunas(self) -> list:
+        return list(self._colunas)
+
+    # selecao: {dimensão: valor}, como no índice de filtros
+    def _filtro(self, selecao: dict):
+        condicoes, parametros = [], {}
+        for i, (dimensao, valor) in enumerate(selecao.items()):
+            coluna = COLUNAS_FILTRO.get(dimensao, _nome(dimensao))
+            if isinstance(valor, Prefixo):
+                condicoes.append(f'starts_with({coluna}, $p{i})')
+                valor = str(valor)
+            else:
+                condicoes.append(f'{coluna} = $p{i}')
+            parametros[f'p{i}'] = valor.item() if isinstance(valor, np.generic) else valor
+        return (' WHERE ' + ' AND '.join(condicoes) if condicoes else ''), parametros
+
+    def valores(self, dimensao: str) -> list:
+        coluna = COLUNAS_FILTRO.get(dimensao, _nome(dimensao))
+        return self._consultar(
+            f'SELECT DISTINCT {coluna} AS valor FROM {TABELA} WHERE {coluna} IS NOT NULL ORDER BY valor'
+        )['valor'].tolist()
+
+    # Células (grupo x Aging) das abas "Em Aberto", "Insucesso" e
+    # "Relatório": o grupo vem da tabela de classificação; vão direto para
+    # cubo.resumir
+    def celulas(self, selecao: dict) -> pd.DataFrame:
+        filtro, parametros = self._filtro(selecao)
+        return self._consultar(
+            f'SELECT COALESCE(g.grupo, 0) AS grupo, a."Aging" AS Aging, COUNT(*) AS linhas, '
+            f'COALESCE(SUM(a."Nota Fiscal/Valor NF"), 0) AS valor_nf '
+            f'FROM (SELECT * FROM {TABELA}{filtro}) AS a '
+            f'LEFT JOIN {TABELA_GRUPOS} AS g ON a."Última Ocorrência" = g.ocorrencia '
+            f'GROUP BY ALL',
+            parametros,
+        )
+
+    def contar(self, selecao: dict, colunas: list, distintas: bool = False) -> int:
+        filtro, parametros = self._filtro(selecao)
+        if distintas:
+            sql = f'SELECT COUNT(*) AS total FROM (SELECT DISTINCT {", ".join(map(_nome, colunas))} FROM {TABELA}{filtro})'
+        else:
+            sql = f'SELECT COUNT(*) AS total FROM {TABELA}{filtro}'
+        return int(self._consultar(sql, parametros)['total'].iloc[0])
+
+    # Página de uma tabela: ordenada e recortada no DuckDB. Com distintas, a
+    # ordem sem coluna de ordenação é a da primeira aparição no relatório,
+    # como na tabela em memória
+    def linhas(self, selecao: dict, colunas: list, distintas: bool = False, limite: int = None,
+               deslocamento: int = 0, ordem: str = None, crescente: bool = True) -> pd.DataFrame:
+        filtro, parametros = self._filtro(selecao)
+        lista = ', '.join(map(_nome, colunas))
+        if distintas:
+            sql = (f'SELECT {lista} FROM (SELECT {lista}, MIN(rowid) AS _posicao FROM {TABELA}{filtro} '
+                   f'GROUP BY ALL)')
+            desempate = '_posicao'
+        else:
+            sql = f'SELECT {lista} FROM {TABELA}{filtro}'
+            desempate = 'rowid'
+        # Vazios por último nos dois sentidos, como na tabela em memória
+        if ordem is not None:
+            sql += f' ORDER BY {_nome(ordem)} {"ASC" if crescente else "DESC"} NULLS LAST, {desempate}'
+        else:
+            sql += f' ORDER BY {desempate}'
+        if limite is not None:
+            sql += ' LIMIT $limite OFFSET $deslocamento'
+            parametros.update(limite=limite, deslocamento=deslocamento)
+        return self._consultar(sql, parametros)
+
+
+if __name__ == '__main__':
+    import time
+
+    inicio = time.perf_counter()
+    consultas = Consultas()
+    print(f'carga: {time.perf_counter() - inicio:.2f}s ({os.cpu_count()} núcleos)')
+
+    cliente, ano = consultas.valores('Cliente')[0], consultas.valores('Ano')[-1]
+    for selecao in [{}, {'Aging': consultas.valores('Aging')[0]}, {'Cliente': cliente, 'Ano': ano}]:
+        inicio = time.perf_counter()
+        resultado = consultas.celulas(selecao)
+        print(f'{selecao}: {len(resultado)} células, {resultado["linhas"].sum()} linhas em {time.perf_counter() - inicio:.3f}s')
+    for colunas, distintas in [(['Agente de Coleta', 'Última Ocorrência', 'N° Minuta', 'Aging'], True),
+                               (['Degradação', 'N° Minuta', 'Aging', 'Nota Fiscal/Valor NF'], False)]:
+        inicio = time.perf_counter()
+        total = consultas.contar({}, colunas, distintas)
+        consultas.linhas({}, colunas, distintas, limite=50, ordem=colunas[-1], crescente=False)
+        print(f'{colunas}: {total} linhas, página ordenada em {time.perf_counter() - inicio:.3f}s')
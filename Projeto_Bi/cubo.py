@@ -0,0 +1,125 @@
+# Cubo pré-agregado das métricas das abas "Em Aberto", "Insucesso" e
+# "Relatório".
+#
+# Montado uma vez por snapshot: uma célula por combinação de Cliente, ano,
+# mês, Aging, Regional e Degradação, com a quantidade de linhas e a soma do
+# valor das NFs. As métricas das abas usam listas de ocorrências do config,
+# então cada célula também guarda em 'grupo' o conjunto (bits) dessas listas
+# que contém a ocorrência. Métricas e gráficos somam células em vez de varrer
+# linhas.
+import numpy as np
+import pandas as pd
+
+from config import *
+
+DIMENSOES_CUBO = ['Cliente', 'Ano', 'Mês', 'Aging', 'Regional', 'Degradação', 'grupo']
+
+# Listas do config consultadas pelas abas; a posição é o bit em 'grupo'
+LISTAS_METRICAS = [
+    ocorrencias_agendamento_em_aberto,
+    ocorrencias_coleta_em_aberto,
+    ocorrencia_devolucao_em_aberto,
+    aguardando_check_list,
+    coleta_em_aberto,
+    devolvido,
+    ocorrencias_insucesso_de_agendamento,
+    ocorrencia_insucesso_de_coleta,
+    correncia_insucesso_de_devolucao,
+    pendecia,
+]
+
+_BIT_POR_LISTA = {tuple(lista): bit for bit, lista in enumerate(LISTAS_METRICAS)}
+
+
+def _compilar_grupos() -> dict:
+    grupos = {}
+    for bit, lista in enumerate(LISTAS_METRICAS):
+        for ocorrencia in lista:
+            grupos[ocorrencia] = grupos.get(ocorrencia, 0) | (1 << bit)
+    return grupos
+
+
+GRUPO_POR_OCORRENCIA = _compilar_grupos()
+
+
+def grupos_de(ultima_ocorrencia: pd.Series) -> np.ndarray:
+    codigos, valores = pd.factorize(ultima_ocorrencia)
+    grupos = pd.Index(valores, dtype=object).map(GRUPO_POR_OCORRENCIA).fillna(0).to_numpy(dtype='int32')
+    return np.where(codigos == -1, 0, grupos[codigos])
+
+
+def montar_cubo(dados: pd.DataFrame) -> pd.DataFrame:
+    datas = dados['Data do frete']
+    base = pd.DataFrame({
+        'Cliente': dados['Cliente'],
+        'Ano': datas.dt.year.astype('Int16'),
+        'Mês': datas.dt.month.astype('Int8'),
+        'Aging': dados['Aging'],
+        'Regional': dados['Regional'],
+        'Degradação': dados['Degradação'],
+        'grupo': grupos_de(dados['Última Ocorrência']),
+        'valor_nf': dados['Nota Fiscal/Valor NF'],
+    })
+    return (
+        base.groupby(DIMENSOES_CUBO, observed=True, dropna=False)
+        .agg(linhas=('valor_nf', 'size'), valor_nf=('valor_nf', 'sum'))
+        .reset_index()
+    )
+
+
+# Soma cubos montados de partes do relatório (os blocos da gravação) num
+# só, igual ao montar_cubo do relatório inteiro. Blocos com categorias
+# diferentes juntam como object; no cubo somado elas voltam a ser category.
+def juntar_cubos(partes: list) -> pd.DataFrame:
+    celulas = pd.concat(partes, ignore_index=True)
+    for dimensao in ['Cliente', 'Aging', 'Regional', 'Degradação']:
+        if not isinstance(celulas[dimensao].dtype, pd.CategoricalDtype):
+            celulas[dimensao] = celulas[dimensao].astype(object).astype('category')
+    return (
+        celulas.groupby(DIMENSOES_CUBO, observed=True, dropna=False)[['linhas', 'valor_nf']]
+        .sum()
+        .reset_index()
+    )
+
+
+# Mesma seleção usada no índice de filtros: {dimensão: valor}
+def filtrar_cubo(celulas: pd.DataFrame, selecao: dict) -> pd.DataFrame:
+    if not selecao:
+        return celulas
+    mascara = np.ones(len(celulas), dtype=bool)
+    for dimensao, valor in selecao.items():
+        mascara &= (celulas[dimensao] == valor).to_numpy(dtype=bool, na_value=False)
+    return celulas[mascara]
+
+
+def _fatia_bit(celulas: pd.DataFrame, bit: int) -> pd.DataFrame:
+    return celulas[(celulas['grupo'].to_numpy() >> bit) & 1 == 1]
+
+
+# Células cuja Última Ocorrência está numa das listas de LISTAS_METRICAS
+def fatia(celulas: pd.DataFrame, ocorrencias: list) -> pd.DataFrame:
+    return _fatia_bit(celulas, _BIT_POR_LISTA[tuple(ocorrencias)])
+
+
+# Equivalente ao value_counts() de 'Aging' sobre as linhas da fatia
+def contagem_por_aging(celulas: pd.DataFrame) -> pd.Series:
+    contagem = celulas.groupby('Aging', observed=True)['linhas'].sum()
+    return contagem[contagem > 0].sort_values(ascending=False)
+
+
+# Quantidade, valor e contagem por aging de todas as listas de uma vez; é o
+# que as abas exibem e o que fica no cache de resultados
+def resumir(celulas: pd.DataFrame) -> dict:
+    resumo = {}
+    for bit in range(len(LISTAS_METRICAS)):
+        celulas_lista = _fatia_bit(celulas, bit)
+        resumo[bit] = {
+            'linhas': int(celulas_lista['linhas'].sum()),
+            'valor_nf': float(celulas_lista['valor_nf'].sum()),
+            'aging': contagem_por_aging(celulas_lista),
+        }
+    return resumo
+
+
+def metricas(resumo: dict, ocorrencias: list) -> dict:
+    return resumo[_BIT_POR_LISTA[tuple(ocorrencias)]]
@@ -0,0 +1,90 @@
+# Esquema declarado do relatório de agendamento.
+#
+# Cada coluna conhecida tem o tipo final e a regra de conversão, aplicados
+# uma única vez na ingestão: datas viram datetime64, valores viram float64,
+# identificadores numéricos (colunas_inteiras do config) viram Int64 e
+# colunas de poucos valores distintos viram category. Depois disso nenhuma
+# página converte nada; a formatação (dd/mm/aaaa, R$) é só na exibição.
+import pandas as pd
+
+from config import colunas_inteiras
+
+DATA = 'data'
+VALOR = 'valor'
+CATEGORIA = 'categoria'
+TEXTO = 'texto'
+IDENTIFICADOR = 'identificador'
+
+FORMATO_DATA = '%d/%m/%Y'
+
+ESQUEMA = {
+    'Data do frete': {'tipo': DATA, 'formato': FORMATO_DATA},
+    'Previsão Coleta': {'tipo': DATA, 'formato': FORMATO_DATA},
+    'Data Finalização Performance': {'tipo': DATA, 'formato': FORMATO_DATA},
+    'Data Coleta': {'tipo': DATA, 'formato': FORMATO_DATA},
+    'Data Checklist': {'tipo': DATA, 'formato': FORMATO_DATA},
+    'Data Última Tratativa': {'tipo': DATA, 'formato': FORMATO_DATA},
+    'Data Última Ocorrência': {'tipo': DATA, 'formato': FORMATO_DATA},
+    'Previsão de Entrega': {'tipo': DATA, 'formato': FORMATO_DATA},
+    # Pode vir como texto com símbolo e separador de milhar ("$1,234.56")
+    'Nota Fiscal/Valor NF': {'tipo': VALOR, 'remover': r'[\$,]'},
+    'Última Ocorrência': {'tipo': CATEGORIA},
+    'Agente de Coleta': {'tipo': CATEGORIA},
+    'Pagador do frete/Documento': {'tipo': TEXTO},
+    **{coluna: {'tipo': IDENTIFICADOR} for coluna in colunas_inteiras},
+}
+
+COLUNAS_DATA = [coluna for coluna, regra in ESQUEMA.items() if regra['tipo'] == DATA]
+COLUNAS_CATEGORIA = [coluna for coluna, regra in ESQUEMA.items() if regra['tipo'] == CATEGORIA]
+
+
+def converter_data(serie: pd.Series, formato: str) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    return pd.to_datetime(serie, format=formato, errors='coerce')
+
+
+def converter_valor(serie: pd.Series, remover: str) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype('float64')
+    return pd.to_numeric(serie.astype(str).str.replace(remover, '', regex=True), errors='coerce')
+
+
+def converter_texto(serie: pd.Series) -> pd.Series:
+    return serie.fillna('').astype(str)
+
+
+# Vem como 123, 123.0, "123.0" ou "1,234" conforme a planilha e o bloco;
+# o que não for número inteiro fica vazio
+def converter_identificador(serie: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(serie):
+        return serie.astype('Int64')
+    if not pd.api.types.is_float_dtype(serie):
+        texto = serie.astype('string').str.strip().str.replace(',', '', regex=False)
+        serie = pd.to_numeric(texto, errors='coerce')
+    return serie.where(serie % 1 == 0).astype('Int64')
+
+
+# Colunas categóricas de snapshots diferentes têm categorias diferentes e
+# voltam a object num concat; isto as devolve a category
+def categorizar(df: pd.DataFrame) -> pd.DataFrame:
+    for coluna in COLUNAS_CATEGORIA:
+        if coluna in df.columns and not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype('category')
+    return df
+
+
+# Colunas do esquema ausentes no relatório são ignoradas
+def aplicar_esquema(df: pd.DataFrame) -> pd.DataFrame:
+    for coluna, regra in ESQUEMA.items():
+        if coluna not in df.columns:
+            continue
+        if regra['tipo'] == DATA:
+            df[coluna] = converter_data(df[coluna], regra['formato'])
+        elif regra['tipo'] == VALOR:
+            df[coluna] = converter_valor(df[coluna], regra['remover'])
+        elif regra['tipo'] == TEXTO:
+            df[coluna] = converter_texto(df[coluna])
+        elif regra['tipo'] == IDENTIFICADOR:
+            df[coluna] = converter_identificador(df[coluna])
+    return categorizar(df)
@@ -0,0 +1,111 @@
+# Montagem dos snapshots fora do Streamlit.
+#
+#     python -m etl relatorio.xlsx [outro.csv ...] [--processos N] [--publicar]
+#
+# Cada relatório (arquivo local ou URL) passa pela mesma leitura em blocos e
+# pelas mesmas transformações da atualização (cliente, datas, aging,
+# degradação, regional), em processos separados. O resultado de cada um é
+# um snapshot Parquet e o seu cubo pré-agregado, numa pasta por execução.
+# Com --publicar os relatórios, em ordem, viram a versão vigente do painel
+# (o mesmo frete em mais de um relatório vale o do último); o painel então
+# só lê o que já está pronto. A verificação do servidor do RPA não substitui
+# essa versão (só atualiza o aging dela), a não ser com atualizar_sobre_etl.
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pyarrow.parquet as pq
+
+import ingestao
+import snapshot
+from atualizacao import ORIGEM_ETL, ContagemFretes, Mesclagem, Publicacao, hash_frete, publicar_blocos
+from config import dir_snapshot
+
+DIR_ETL = os.path.join(snapshot.DIR_BASE, dir_snapshot, 'etl')
+
+
+def _abrir(origem: str):
+    if origem.startswith(('http://', 'https://')):
+        arquivo, _ = ingestao.baixar_para_arquivo(origem)
+        return arquivo
+    return open(origem, 'rb')
+
+
+# A posição na linha de comando entra no nome: relatórios com o mesmo nome
+# (relatorio.xlsx e relatorio.csv, pastas ou URLs diferentes) não gravam
+# no mesmo arquivo
+def _nome_saida(origem: str, posicao: int) -> str:
+    return f"{posicao:03d}-{os.path.splitext(os.path.basename(origem.rstrip('/')))[0]}"
+
+
+# Executado num processo do pool: relatório -> snapshot + cubo na pasta
+def transformar(origem: str, pasta: str, posicao: int = 0) -> dict:
+    inicio = time.perf_counter()
+    nome = _nome_saida(origem, posicao)
+    destino = os.path.join(pasta, nome + '.parquet')
+    mesclagem = Mesclagem()
+    publicacao = Publicacao()
+    with _abrir(origem) as arquivo:
+        brutos = ingestao.ler_blocos(arquivo, ingestao.formato_de(origem))
+        snapshot.gravar_snapshot_em_blocos(publicacao.acompanhar(mesclagem.blocos(brutos)), destino)
+
+    publicacao.cubo.to_parquet(os.path.join(pasta, nome + '.cubo.parquet'), index=False)
+    return {
+        'origem': origem,
+        'destino': destino,
+        'linhas': mesclagem.alterados,
+        'segundos': round(time.perf_counter() - inicio, 1),
+    }
+
+
+# Blocos (row groups) dos snapshots, do último relatório para o primeiro,
+# pulando os fretes (todas as linhas deles) que um relatório mais novo já
+# trouxe. Os fretes de um relatório só entram em `vistos` depois dele
+# inteiro, para que as várias NFs do mesmo frete fiquem juntas.
+def _blocos_publicacao(destinos: list):
+    vistos = ContagemFretes()
+    for destino in reversed(destinos):
+        arquivo = pq.ParquetFile(destino)
+        do_relatorio = []
+        for grupo in range(arquivo.num_row_groups):
+            bloco = snapshot.ler_grupo(arquivo, grupo)
+            fretes = hash_frete(bloco)
+            novos = vistos.vezes(fretes) == 0
+            do_relatorio.append(np.unique(fretes))
+            if novos.any():
+                yield bloco[novos].reset_index(drop=True)
+        vistos.somar(np.unique(np.concatenate(do_relatorio)))
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(prog='python -m etl', description='Monta snapshots do relatório de agendamento.')
+    parser.add_argument('relatorios', nargs='+', help='arquivos .xlsx/.csv ou URLs, do mais antigo para o mais novo')
+    parser.add_argument('--processos', type=int, default=os.cpu_count(), help='relatórios transformados em paralelo')
+    parser.add_argument('--saida', default=None, help=f'pasta dos resultados (padrão: {DIR_ETL}/<execução>)')
+    parser.add_argument('--publicar', action='store_true', help='publica os relatórios como a versão vigente do painel')
+    args = parser.parse_args(argumentos)
+
+    pasta = args.saida or os.path.join(DIR_ETL, datetime.now().strftime('%Y%m%d%H%M%S'))
+    os.makedirs(pasta, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=max(1, min(args.processos, len(args.relatorios)))) as pool:
+        resultados = list(pool.map(
+            transformar, args.relatorios, [pasta] * len(args.relatorios), range(len(args.relatorios))
+        ))
+    for resultado in resultados:
+        print(f"{resultado['origem']}: {resultado['linhas']} linhas em {resultado['segundos']}s -> {resultado['destino']}")
+
+    if args.publicar:
+        metadados = publicar_blocos(
+            _blocos_publicacao([resultado['destino'] for resultado in resultados]),
+            origem=ORIGEM_ETL, url=None, sha256=None, etag=None, last_modified=None,
+            relatorios=args.relatorios,
+        )
+        print(f"Versão publicada: {metadados['versao']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+# Histórico de ocorrências por frete, montado a partir dos snapshots.
+#
+# O relatório só traz a Última Ocorrência de cada frete; a cada versão
+# publicada do snapshot, as linhas em que o par (minuta, ocorrência, data da
+# ocorrência) mudou viram eventos. Cada linha do snapshot guarda o hash desse
+# par (hash_evento, coluna interna _evento) e a atualização, que já sabe
+# quais linhas mudaram, compara só essas com a versão anterior e passa os
+# eventos novos a `registrar`. Os eventos de uma versão são gravados num
+# Parquet próprio (`parte-<versão>.parquet`), ordenado por minuta, sem
+# reescrever os anteriores: publicar uma versão custa a escrita só dos
+# eventos novos. Quando as partes passam de PARTES_ANTES_DE_COMPACTAR, elas
+# são juntadas num `base-<versão>.parquet`.
+#
+# Na leitura os eventos ficam ordenados por minuta e data; Eventos guarda
+# onde começa cada minuta (busca binária) e `tentativas` calcula, com
+# operações agrupadas, as tentativas de coleta por frete, o intervalo entre
+# elas e a taxa de sucesso por agente, para a aba "Tentativas".
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import dir_snapshot, ocorrencia_insucesso_de_coleta, ocorrencias_coleta_realizada
+from instrumentacao import etapa
+from snapshot import DIR_BASE
+
+PASTA = 'eventos'
+NOME_PARTE = 'parte-{versao}.parquet'
+NOME_BASE = 'base-{versao}.parquet'
+PARTES_ANTES_DE_COMPACTAR = 32
+
+MINUTA = 'N° Minuta'
+OCORRENCIA = 'Ocorrência'
+DATA = 'Data'
+OBSERVADO_EM = 'Observado em'
+VERSAO = 'Versão'
+
+# Coluna do snapshot -> coluna do evento; Cliente, Agente e Regional são os
+# do frete quando o evento foi observado
+COLUNAS_EVENTO = {
+    'N° Minuta': MINUTA,
+    'Última Ocorrência': OCORRENCIA,
+    'Data Última Ocorrência': DATA,
+    'Agente de Coleta': 'Agente de Coleta',
+    'Cliente': 'Cliente',
+    'Regional': 'Regional',
+}
+COLUNAS_CATEGORIA = [OCORRENCIA, 'Agente de Coleta', 'Cliente', 'Regional']
+
+# Dimensões da seleção da barra lateral que o histórico também tem
+DIMENSOES_FILTRO = ['Cliente', 'Regional']
+
+TENTATIVAS_COLETA = list(dict.fromkeys(ocorrencia_insucesso_de_coleta + ocorrencias_coleta_realizada))
+
+
+def pasta_eventos() -> str:
+    return os.path.join(DIR_BASE, dir_snapshot, PASTA)
+
+
+def _versao_do_arquivo(caminho: str) -> str:
+    return os.path.basename(caminho).split('-', 1)[1].rsplit('.', 1)[0]
+
+
+# Base mais recente e as partes posteriores a ela, em ordem de versão
+def _arquivos() -> list:
+    pasta = pasta_eventos()
+    bases = sorted(glob.glob(os.path.join(pasta, NOME_BASE.format(versao='*'))), key=_versao_do_arquivo)
+    partes = sorted(glob.glob(os.path.join(pasta, NOME_PARTE.format(versao='*'))), key=_versao_do_arquivo)
+    desde = _versao_do_arquivo(bases[-1]) if bases else ''
+    return bases[-1:] + [parte for parte in partes if _versao_do_arquivo(parte) > desde]
+
+
+def _gravar(df: pd.DataFrame, caminho: str):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    df.to_parquet(temporario, index=False)
+    os.replace(temporario, caminho)
+
+
+# Hash do par (minuta, ocorrência, data da ocorrência) de cada linha do
+# snapshot. Os tipos são normalizados antes, para que a mesma linha tenha o
+# mesmo hash lida do Parquet, do Arrow ou recém-classificada
+def hash_evento(dados: pd.DataFrame) -> np.ndarray:
+    vazio = pd.Series(index=dados.index, dtype='object')
+    data = dados['Data Última Ocorrência'] if 'Data Última Ocorrência' in dados.columns else vazio
+    par = pd.DataFrame({
+        'minuta': pd.to_numeric(dados['N° Minuta'], errors='coerce').astype('float64'),
+        'ocorrencia': dados['Última Ocorrência'].astype(object).fillna('').astype(str),
+        'data': pd.to_datetime(data).astype('datetime64[ns]'),
+    })
+    return pd.util.hash_pandas_object(par, index=False).to_numpy()
+
+
+# Colunas de evento das linhas do snapshot dadas (as que viraram eventos)
+def observados(linhas: pd.DataFrame) -> pd.DataFrame:
+    colunas = {origem: destino for origem, destino in COLUNAS_EVENTO.items() if origem in linhas.columns}
+    observados = linhas[list(colunas)].rename(columns=colunas)
+    observados = observados[observados[MINUTA].notna() & observados[OCORRENCIA].notna()]
+    for destino in COLUNAS_EVENTO.values():
+        if destino not in observados:
+            observados[destino] = pd.NaT if destino == DATA else None
+    return observados.astype({MINUTA: 'int64', **{coluna: 'category' for coluna in COLUNAS_CATEGORIA}})
+
+
+# Acrescenta ao histórico os eventos novos de uma versão: os `observados`
+# das linhas que mudaram, em partes (chamado na publicação da versão).
+# Publicar a mesma versão de novo não duplica os eventos.
+def registrar(partes: list, versao: str, agora) -> int:
+    caminho = os.path.join(pasta_eventos(), NOME_PARTE.format(versao=versao))
+    if os.path.exists(caminho):
+        return 0
+
+    with etapa('eventos') as registro:
+        novos = pd.concat(partes, ignore_index=True) if partes else _vazio().drop(columns=[OBSERVADO_EM, VERSAO])
+        registro['linhas_entrada'] = len(novos)
+        # Um frete com várias NFs aparece em várias linhas com o mesmo par
+        novos = novos.drop_duplicates([MINUTA, OCORRENCIA, DATA])
+        novos = novos.astype({coluna: 'category' for coluna in COLUNAS_CATEGORIA})
+        novos[OBSERVADO_EM] = pd.Timestamp(agora)
+        novos[VERSAO] = versao
+        novos = novos.sort_values([MINUTA, DATA], kind='stable', na_position='first', ignore_index=True)
+        registro['linhas_saida'] = len(novos)
+        _gravar(novos, caminho)
+
+    if len(_arquivos()) > PARTES_ANTES_DE_COMPACTAR:
+        compactar()
+    return len(novos)
+
+
+# Junta base e partes numa base nova (com a versão da parte mais recente) e
+# apaga os arquivos juntados. Leitores que já listaram os arquivos antigos
+# tentam de novo (carregar)
+def compactar():
+    arquivos = _arquivos()
+    if len(arquivos) < 2:
+        return
+    with etapa('eventos_compactacao') as registro:
+        eventos = _ler(arquivos)
+        registro['linhas_saida'] = len(eventos)
+        _gravar(eventos, os.path.join(pasta_eventos(), NOME_BASE.format(versao=_versao_do_arquivo(arquivos[-1]))))
+    for arquivo in arquivos:
+        try:
+            os.remove(arquivo)
+        except OSError:
+            pass
+
+
+def _vazio() -> pd.DataFrame:
+    return pd.DataFrame({
+        MINUTA: pd.Series(dtype='int64'), OCORRENCIA: pd.Series(dtype='category'),
+        DATA: pd.Series(dtype='datetime64[ns]'),
+        **{coluna: pd.Series(dtype='category') for coluna in COLUNAS_CATEGORIA if coluna != OCORRENCIA},
+        OBSERVADO_EM: pd.Series(dtype='datetime64[ns]'), VERSAO: pd.Series(dtype='object'),
+    })
+
+
+# Versões sem evento novo também têm a sua parte (vazia), que fica de fora
+def _ler(arquivos: list) -> pd.DataFrame:
+    partes = [parte for parte in (pd.read_parquet(arquivo) for arquivo in arquivos) if len(parte)]
+    if not partes:
+        return _vazio()
+    eventos = pd.concat(partes, ignore_index=True)
+    for coluna in COLUNAS_CATEGORIA:
+        eventos[coluna] = eventos[coluna].astype('category')
+    eventos[DATA] = eventos[DATA].fillna(eventos[OBSERVADO_EM])
+    return eventos.sort_values([MINUTA, DATA, OBSERVADO_EM], kind='stable', ignore_index=True)
+
+
+# Todo o histórico gravado (inclusive o de uma versão ainda sendo publicada)
+def carregar() -> 'Eventos':
+    with etapa('leitura_eventos') as registro:
+        for tentativa in range(3):
+            try:
+                eventos = _ler(_arquivos())
+                break
+            except FileNotFoundError:
+                if tentativa == 2:
+                    raise
+        registro['linhas_saida'] = len(eventos)
+        return Eventos(eventos)
+
+
+class Eventos:
+    def __init__(self, eventos: pd.DataFrame):
+        self.eventos = eventos
+        minutas = eventos[MINUTA].to_numpy(dtype='int64')
+        inicio = np.flatnonzero(np.r_[True, minutas[1:] != minutas[:-1]]) if len(minutas) else np.array([], dtype='int64')
+        self._minutas = minutas[inicio]
+        self._limites = np.r_[inicio, len(minutas)]
+
+    # Eventos de uma minuta, em ordem cronológica
+    def de_minuta(self, minuta: int) -> pd.DataFrame:
+        i = np.searchsorted(self._minutas, minuta)
+        if i == len(self._minutas) or self._minutas[i] != minuta:
+            return self.eventos.iloc[:0]
+        return self.eventos.iloc[self._limites[i]:self._limites[i + 1]]
+
+    # Eventos dos fretes da seleção (só as dimensões de DIMENSOES_FILTRO)
+    def filtrar(self, selecao: dict) -> pd.DataFrame:
+        mascara = np.ones(len(self.eventos), dtype=bool)
+        for dimensao in DIMENSOES_FILTRO:
+            if dimensao in selecao:
+                mascara &= (self.eventos[dimensao] == selecao[dimensao]).to_numpy()
+        return self.eventos if mascara.all() else self.eventos[mascara]
+
+
+# Tentativas de coleta (insucessos de coleta e coletas realizadas) dos
+# eventos, já ordenados por minuta e data: uma linha por frete, os
+# intervalos entre tentativas seguidas do mesmo frete e o resumo por agente
+# (agente da última tentativa)
+def tentativas(eventos: pd.DataFrame) -> dict:
+    with etapa('tentativas', len(eventos)) as registro:
+        eventos = eventos[eventos[OCORRENCIA].isin(TENTATIVAS_COLETA).to_numpy()]
+        minutas = eventos[MINUTA].to_numpy()
+        datas = eventos[DATA].to_numpy()
+        sucesso = eventos[OCORRENCIA].isin(ocorrencias_coleta_realizada).to_numpy()
+
+        mesmo_frete = np.zeros(len(eventos), dtype=bool)
+        mesmo_frete[1:] = minutas[1:] == minutas[:-1]
+        intervalo = np.full(len(eventos), np.nan)
+        intervalo[mesmo_frete] = (datas[1:] - datas[:-1])[mesmo_frete[1:]] / np.timedelta64(1, 'D')
+
+        base = pd.DataFrame({
+            MINUTA: minutas, 'sucesso': sucesso, 'intervalo': intervalo,
+            'Agente de Coleta': eventos['Agente de Coleta'].to_numpy(),
+        })
+        agrupado = base.groupby(MINUTA, sort=False)
+        fretes = pd.DataFrame({
+            'Tentativas': agrupado.size(),
+            'Coletado': agrupado['sucesso'].any(),
+            'Intervalo médio (dias)': agrupado['intervalo'].mean(),
+            'Agente de Coleta': agrupado['Agente de Coleta'].last(),
+        }).reset_index()
+
+        por_agente = fretes.groupby('Agente de Coleta', observed=True).agg(
+            Fretes=(MINUTA, 'size'),
+            Tentativas=('Tentativas', 'sum'),
+            Coletados=('Coletado', 'sum'),
+        )
+        por_agente['Tentativas por frete'] = por_agente['Tentativas'] / por_agente['Fretes']
+        por_agente['Taxa de sucesso (%)'] = 100 * por_agente['Coletados'] / por_agente['Fretes']
+        por_agente['Intervalo mediano (dias)'] = base.groupby('Agente de Coleta', observed=True)['intervalo'].median()
+        registro['linhas_saida'] = len(fretes)
+        return {
+            'fretes': fretes,
+            'por_agente': por_agente.reset_index().sort_values('Fretes', ascending=False, ignore_index=True),
+            'distribuicao': fretes['Tentativas'].value_counts().sort_index(),
+            'intervalos': intervalo[mesmo_frete],
+        }
@@ -0,0 +1,96 @@
+# Índice dos filtros da barra lateral.
+#
+# Construído uma vez por snapshot: para cada dimensão guarda, por valor, o
+# array ordenado das posições das linhas que têm aquele valor; ano e mês
+# saem da 'Data do frete'. Uma combinação de filtros vira a interseção
+# desses arrays, sem copiar nem mascarar o DataFrame a cada filtro.
+import numpy as np
+import pandas as pd
+
+DIMENSOES = ['Cliente', 'Aging', 'Regional', 'Degradação']
+COLUNA_DATA = 'Data do frete'
+
+_VAZIO = np.array([], dtype=np.intp)
+
+
+# Valor -> posições (em ordem crescente), na ordem em que os valores
+# aparecem no relatório; linhas vazias ficam fora de todos os valores
+def _posicoes_por_valor(coluna: pd.Series) -> dict:
+    codigos, valores = pd.factorize(coluna)
+    ordem = np.argsort(codigos, kind='stable')
+    limites = np.searchsorted(codigos[ordem], np.arange(len(valores) + 1))
+    return {
+        valor: ordem[limites[i]:limites[i + 1]]
+        for i, valor in enumerate(valores)
+    }
+
+
+# Posições das linhas de cada valor de uma coluna de identificadores (N°
+# Minuta, referência, CNPJ...): os valores distintos ficam ordenados numa
+# tabela hash e as posições, agrupadas por valor na mesma ordem, num único
+# array. Buscar um valor é uma consulta na tabela e um recorte do array;
+# buscar um prefixo é uma busca binária nos valores ordenados, e os valores
+# com o prefixo são vizinhos, então também é um único recorte.
+class IndiceIdentificador:
+    def __init__(self, coluna: pd.Series):
+        if isinstance(coluna.dtype, pd.CategoricalDtype):
+            # A ordem das categorias não é a ordem do texto
+            coluna = coluna.astype(object)
+        codigos, valores = pd.factorize(coluna, sort=True)
+        self.valores = pd.Index(valores)
+        self.ordem = np.argsort(codigos, kind='stable')
+        self.limites = np.searchsorted(codigos[self.ordem], np.arange(len(valores) + 1))
+
+    def _recorte(self, inicio: int, fim: int) -> np.ndarray:
+        return self.ordem[self.limites[inicio]:self.limites[fim]]
+
+    def posicoes(self, valor) -> np.ndarray:
+        codigo = self.valores.get_indexer([valor])[0]
+        if codigo == -1:
+            return _VAZIO
+        return self._recorte(codigo, codigo + 1)
+
+    # Só para colunas de texto
+    def prefixo(self, texto: str) -> np.ndarray:
+        inicio = self.valores.searchsorted(texto, side='left')
+        fim = self.valores.searchsorted(texto + '\U0010ffff', side='left')
+        return self._recorte(inicio, fim)
+
+
+# Mantém só as posições de `menor` que também estão em `maior`
+# (ambos ordenados): busca binária do menor dentro do maior
+def _intersecao(menor: np.ndarray, maior: np.ndarray) -> np.ndarray:
+    if len(menor) == 0 or len(maior) == 0:
+        return _VAZIO
+    indices = np.minimum(np.searchsorted(maior, menor), len(maior) - 1)
+    return menor[maior[indices] == menor]
+
+
+class IndiceFiltros:
+    def __init__(self, dados: pd.DataFrame, dimensoes: list = DIMENSOES, coluna_data: str = COLUNA_DATA):
+        self.total = len(dados)
+        self.posicoes = {
+            dimensao: _posicoes_por_valor(dados[dimensao])
+            for dimensao in dimensoes if dimensao in dados.columns
+        }
+        datas = dados[coluna_data]
+        self.posicoes['Ano'] = _posicoes_por_valor(datas.dt.year.astype('Int16'))
+        self.posicoes['Mês'] = _posicoes_por_valor(datas.dt.month.astype('Int8'))
+
+    # Opções de um filtro, na ordem de aparição (como Series.unique())
+    def valores(self, dimensao: str) -> list:
+        return list(self.posicoes[dimensao])
+
+    # selecao: {dimensão: valor escolhido}; dimensões ausentes não filtram
+    def filtrar(self, selecao: dict) -> np.ndarray:
+        conjuntos = sorted(
+            (self.posicoes[dimensao].get(valor, _VAZIO) for dimensao, valor in selecao.items()),
+            key=len,
+        )
+        if not conjuntos:
+            return np.arange(self.total)
+
+        resultado = conjuntos[0]
+        for conjunto in conjuntos[1:]:
+            resultado = _intersecao(resultado, conjunto)
+        return resultado
@@ -0,0 +1,94 @@
+# De onde a página de Degradação tira opções de filtro, métricas e tabelas.
+#
+# As duas fontes têm a mesma interface: FonteSnapshot responde com o
+# snapshot em memória (índice de filtros + cubo) e FonteBanco com consultas
+# SQL, sem montar o relatório em pandas: no MariaDB (banco.py) ou no DuckDB
+# embutido (consultas.Consultas). A escolha é feita por backend_dados no
+# config. As tabelas saem como origens da tabela paginada.
+import pandas as pd
+
+import banco
+from cubo import montar_cubo, filtrar_cubo, resumir
+from busca import IndiceBusca, campos_disponiveis, colunas_resultado, termo_da_busca, busca_exata
+from filtros import IndiceFiltros
+from instrumentacao import etapa
+from tabela import LinhasMemoria, LinhasBanco
+
+
+class FonteSnapshot:
+    # cubo: o pré-agregado gravado com a versão; sem ele o cubo é montado aqui
+    def __init__(self, dados: pd.DataFrame, cubo: pd.DataFrame = None):
+        self.dados = dados
+        self.colunas = dados.columns.tolist()
+        with etapa('indices', len(dados)):
+            self.indice = IndiceFiltros(dados)
+            self.cubo = cubo if cubo is not None else montar_cubo(dados)
+            self._distintas = {}
+            self.busca = IndiceBusca(dados)
+        self.campos_busca = list(self.busca.campos)
+
+    def valores(self, dimensao: str) -> list:
+        return self.indice.valores(dimensao)
+
+    # Posições filtradas (uma única interseção no índice) e métricas das abas
+    # (células do cubo com os mesmos filtros)
+    def resultado(self, selecao: dict) -> dict:
+        with etapa('filtro', len(self.dados)) as registro:
+            posicoes = self.indice.filtrar(selecao)
+            posicoes.flags.writeable = False
+            registro['linhas_saida'] = len(posicoes)
+            return {'posicoes': posicoes, 'resumo': resumir(filtrar_cubo(self.cubo, selecao))}
+
+    # Colunas pedidas das linhas do resultado (ou do relatório inteiro). Com
+    # distintas, fica a primeira posição de cada combinação; no relatório
+    # inteiro essas posições são guardadas, já que só mudam com a versão
+    def linhas(self, colunas: list, resultado: dict = None, distintas: bool = False) -> LinhasMemoria:
+        posicoes = resultado['posicoes'] if resultado is not None else None
+        if distintas:
+            if posicoes is None:
+                chave = tuple(colunas)
+                if chave not in self._distintas:
+                    self._distintas[chave] = (~self.dados[colunas].duplicated()).to_numpy().nonzero()[0]
+                posicoes = self._distintas[chave]
+            else:
+                posicoes = posicoes[~self.dados[colunas].take(posicoes).duplicated().to_numpy()]
+        return LinhasMemoria(self.dados, colunas, posicoes)
+
+    # Fretes encontrados pela busca da barra lateral, em todo o relatório
+    def buscar(self, campo: str, texto: str) -> LinhasMemoria:
+        colunas = colunas_resultado(self.busca.campos[campo], self.colunas)
+        return LinhasMemoria(self.dados, colunas, self.busca.buscar(campo, texto))
+
+
+class FonteBanco:
+    # consultas: o módulo banco ou uma Consultas do DuckDB (mesmas funções)
+    def __init__(self, consultas=banco):
+        self.consultas = consultas
+        self.colunas = consultas.colunas()
+        self._campos = campos_disponiveis(self.colunas)
+        self.campos_busca = list(self._campos)
+        self._valores = {}
+
+    # As opções só mudam com a versão, e a fonte é recriada a cada versão
+    def valores(self, dimensao: str) -> list:
+        if dimensao not in self._valores:
+            self._valores[dimensao] = self.consultas.valores(dimensao)
+        return self._valores[dimensao]
+
+    def resultado(self, selecao: dict) -> dict:
+        with etapa('filtro'):
+            return {'selecao': dict(selecao), 'resumo': resumir(self.consultas.celulas(selecao))}
+
+    def linhas(self, colunas: list, resultado: dict = None, distintas: bool = False) -> LinhasBanco:
+        selecao = resultado['selecao'] if resultado is not None else {}
+        return LinhasBanco(selecao, colunas, distintas, self.consultas)
+
+    # Os índices das colunas de busca (INDICES do banco) fazem a busca
+    def buscar(self, campo: str, texto: str) -> LinhasBanco:
+        coluna = self._campos[campo]
+        colunas = colunas_resultado(coluna, self.colunas)
+        termo = termo_da_busca(coluna, texto)
+        if termo is None:
+            return LinhasMemoria(pd.DataFrame(columns=colunas), colunas)
+        valor = termo if busca_exata(coluna) else banco.Prefixo(termo)
+        return LinhasBanco({coluna: valor}, colunas, consultas=self.consultas)
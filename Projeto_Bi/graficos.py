@@ -0,0 +1,33 @@
+# Gráficos de aging das abas "Em Aberto" e "Insucesso".
+#
+# As contagens por faixa de aging já vêm agregadas do cubo (metricas). Cada
+# par barra + pizza é montado no Plotly uma vez por (versão, seleção,
+# gráfico) e guardado no cache de resultados, compartilhado entre as
+# sessões: sessões com a mesma seleção recebem a mesma figura, e rerun e
+# troca de aba só reenviam a figura pronta. Ficam no cache as figuras (e
+# não o JSON delas) porque o st.plotly_chart revalida especificações em
+# dict montando a figura de novo.
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from instrumentacao import etapa
+
+
+def figuras_aging(contagem: pd.Series, titulo: str) -> dict:
+    return {
+        'barra': px.bar(x=contagem.index, y=contagem.values, title=titulo),
+        'pizza': px.pie(names=contagem.index, values=contagem.values, title=titulo),
+    }
+
+
+# cache: o CacheLRU de resultados; chave: a da seleção (chave_selecao); o
+# título identifica o gráfico na seleção
+def exibir_aging(cache, chave: tuple, contagem: pd.Series, titulo: str, aviso: str):
+    if contagem.empty:
+        st.warning(aviso)
+        return
+    with etapa(f'grafico:{titulo}', int(contagem.sum())):
+        figuras = cache.obter(chave + (('grafico', titulo),), lambda: figuras_aging(contagem, titulo))
+        st.plotly_chart(figuras['barra'])
+        st.plotly_chart(figuras['pizza'])
@@ -0,0 +1,165 @@
+# Leitura do relatório em blocos, com memória limitada.
+#
+# O download vai para um arquivo temporário (em memória até uma fração do
+# limite, depois em disco) e é lido em blocos de linhas: openpyxl em modo
+# somente leitura para .xlsx, read_csv em pedaços quando o servidor do RPA
+# oferece .csv. O relatório bruto nunca fica inteiro em memória: cada bloco é
+# classificado e gravado no snapshot antes de o próximo ser lido. O tamanho
+# dos blocos sai de limite_memoria_ingestao_mb, medindo o primeiro bloco.
+import hashlib
+import itertools
+import tempfile
+
+import openpyxl
+import pandas as pd
+import requests
+
+from config import limite_memoria_ingestao_mb, colunas_descartadas, colunas_inteiras
+from esquema import COLUNAS_CATEGORIA
+from compactacao import TIPO_TEXTO
+from instrumentacao import etapa
+
+TAMANHO_PEDACO_DOWNLOAD = 1024 * 1024
+
+# O primeiro bloco serve de amostra para medir o tamanho de uma linha
+LINHAS_AMOSTRA = 1000
+
+# Do limite, um quarto fica para o download em memória e metade para os
+# blocos; cada bloco existe em até FATOR_COPIAS cópias durante a classificação
+FRACAO_DOWNLOAD = 0.25
+FRACAO_BLOCOS = 0.5
+FATOR_COPIAS = 4
+
+# Colunas gravadas como category em todos os blocos; as demais colunas de
+# texto são gravadas como string e compactadas na leitura do snapshot
+COLUNAS_DERIVADAS = ['Cliente', 'Aging', 'Degradação', 'Regional']
+
+
+def limite_bytes() -> int:
+    return limite_memoria_ingestao_mb * 1024 * 1024
+
+
+def formato_de(url: str) -> str:
+    return 'csv' if url.lower().endswith('.csv') else 'xlsx'
+
+
+# Baixa o relatório em pedaços, calculando o sha256 no caminho. O arquivo
+# devolvido fica aberto e deve ser fechado por quem chamou.
+def baixar_para_arquivo(url: str):
+    arquivo = tempfile.SpooledTemporaryFile(max_size=int(limite_bytes() * FRACAO_DOWNLOAD))
+    sha256 = hashlib.sha256()
+    try:
+        with etapa('download'), requests.get(url, stream=True, timeout=300) as resposta:
+            resposta.raise_for_status()
+            for pedaco in resposta.iter_content(TAMANHO_PEDACO_DOWNLOAD):
+                arquivo.write(pedaco)
+                sha256.update(pedaco)
+    except BaseException:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return arquivo, sha256.hexdigest()
+
+
+# Mesmos nomes que o read_excel daria: cabeçalho vazio vira "Unnamed: i" e
+# nomes repetidos ganham ".1", ".2"...
+def _nomes_colunas(cabecalho: tuple) -> list:
+    nomes, vistos = [], {}
+    for i, nome in enumerate(cabecalho):
+        nome = f'Unnamed: {i}' if nome is None else str(nome)
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f'{nome}.{vistos[nome]}'
+        else:
+            vistos[nome] = 0
+        nomes.append(nome)
+    return nomes
+
+
+# Valores como vieram da planilha (object): o hash de uma linha não pode
+# depender dos tipos que o pandas inferiria para o bloco em que ela caiu
+def _quadro(linhas: list, colunas: list) -> pd.DataFrame:
+    largura = len(colunas)
+    linhas = [tuple(linha[:largura]) + (None,) * (largura - len(linha)) for linha in linhas]
+    return pd.DataFrame(linhas, columns=colunas, dtype=object)
+
+
+# Leitores: geradores que recebem (send) o número de linhas do próximo bloco
+def _leitor_xlsx(arquivo):
+    livro = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        planilha = livro.worksheets[0]
+        # A dimensão gravada no arquivo pelo RPA nem sempre é confiável
+        planilha.reset_dimensions()
+        linhas = (
+            linha for linha in planilha.iter_rows(values_only=True)
+            if any(valor is not None for valor in linha)
+        )
+        colunas = _nomes_colunas(next(linhas, ()))
+        tamanho = yield
+        while True:
+            bloco = list(itertools.islice(linhas, tamanho))
+            if not bloco:
+                return
+            tamanho = yield _quadro(bloco, colunas)
+    finally:
+        livro.close()
+
+
+def _leitor_csv(arquivo):
+    with pd.read_csv(arquivo, dtype=object, iterator=True) as leitor:
+        tamanho = yield
+        while True:
+            try:
+                bloco = leitor.get_chunk(tamanho)
+            except StopIteration:
+                return
+            tamanho = yield bloco
+
+
+# Quantas linhas cabem num bloco, pelo tamanho médio das linhas da amostra
+def linhas_por_bloco(amostra: pd.DataFrame) -> int:
+    bytes_por_linha = max(amostra.memory_usage(index=False, deep=True).sum() / max(len(amostra), 1), 1)
+    return max(LINHAS_AMOSTRA, int(limite_bytes() * FRACAO_BLOCOS / FATOR_COPIAS / bytes_por_linha))
+
+
+# Blocos de linhas brutas do relatório (todas as colunas como object)
+def ler_blocos(arquivo, formato: str):
+    leitor = _leitor_csv(arquivo) if formato == 'csv' else _leitor_xlsx(arquivo)
+    next(leitor)
+    tamanho = None
+    try:
+        while True:
+            try:
+                with etapa('leitura_bloco') as registro:
+                    bloco = leitor.send(tamanho or LINHAS_AMOSTRA)
+                    registro['linhas_saida'] = len(bloco)
+            except StopIteration:
+                return
+            if tamanho is None:
+                tamanho = linhas_por_bloco(bloco)
+            yield bloco
+    finally:
+        leitor.close()
+
+
+# Todos os blocos de um snapshot precisam gravar os mesmos tipos: category só
+# nas colunas que são category em qualquer bloco (esquema e derivadas);
+# datas, valores e as colunas internas ficam como estão; identificadores
+# ficam Int64 (o snapshot lido vem compactado em Int32); o resto vira texto
+def normalizar_bloco(bloco: pd.DataFrame) -> pd.DataFrame:
+    bloco = bloco.drop(columns=[coluna for coluna in colunas_descartadas if coluna in bloco.columns])
+    fixas = set(COLUNAS_CATEGORIA + COLUNAS_DERIVADAS)
+    for coluna in bloco.columns:
+        tipo = bloco[coluna].dtype
+        if coluna in fixas and isinstance(tipo, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_datetime64_any_dtype(tipo) or pd.api.types.is_float_dtype(tipo):
+            continue
+        if pd.api.types.is_unsigned_integer_dtype(tipo):
+            continue
+        if coluna in colunas_inteiras and pd.api.types.is_integer_dtype(tipo):
+            bloco[coluna] = bloco[coluna].astype('Int64')
+            continue
+        bloco[coluna] = bloco[coluna].astype(TIPO_TEXTO)
+    return bloco
@@ -0,0 +1,136 @@
+# Medição de tempo e memória por etapa, no processo do painel.
+#
+# Cada etapa (download, leitura, classificação, filtro, render de aba,
+# tabela, gráfico...) é envolvida em `etapa(nome)` ou decorada com
+# `medir(nome)` e registra tempo de parede, tempo de CPU da thread, linhas
+# de entrada/saída e a memória do processo. Os registros ficam
+# num buffer circular com os tamanho_buffer_instrumentacao mais recentes,
+# compartilhado pelas sessões e pela thread de atualização; a página
+# pages/Diagnóstico.py mostra p50/p95 por etapa e exporta o buffer em JSON.
+#
+# A memória de cada etapa é o que mudou durante ela: variacao_rss_mb (RSS
+# no fim menos RSS no início) e aumento_pico_mb (quanto o pico do processo
+# subiu; zero se a etapa não passou do maior uso anterior). rss_mb e
+# pico_processo_mb são o RSS e o pico do processo desde que ele começou,
+# no fim da etapa, e não dizem nada da etapa em si.
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import psutil
+
+from config import tamanho_buffer_instrumentacao
+
+try:
+    import resource
+except ImportError:  # Windows: o pico vem do psutil (peak_wset)
+    resource = None
+
+MB = 1024 * 1024
+
+_registros = deque(maxlen=tamanho_buffer_instrumentacao)
+_processo = psutil.Process(os.getpid())
+
+
+# RSS atual e pico do processo até agora, em MB
+def memoria_mb() -> tuple:
+    info = _processo.memory_info()
+    pico = getattr(info, 'peak_wset', None)
+    if pico is None and resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return info.rss / MB, (pico or info.rss) / MB
+
+
+def _linhas(valor):
+    try:
+        return len(valor)
+    except TypeError:
+        return None
+
+
+# O registro é devolvido para quem mede preencher linhas_saida (ou
+# linhas_entrada) dentro do bloco
+@contextmanager
+def etapa(nome: str, linhas_entrada: int = None):
+    registro = {
+        'etapa': nome,
+        'inicio': datetime.now().isoformat(timespec='milliseconds'),
+        'thread': threading.current_thread().name,
+        'linhas_entrada': linhas_entrada,
+        'linhas_saida': None,
+    }
+    rss, pico = memoria_mb()
+    parede, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield registro
+    finally:
+        registro['parede_ms'] = (time.perf_counter() - parede) * 1000
+        registro['cpu_ms'] = (time.thread_time() - cpu) * 1000
+        registro['rss_mb'], registro['pico_processo_mb'] = memoria_mb()
+        registro['variacao_rss_mb'] = registro['rss_mb'] - rss
+        registro['aumento_pico_mb'] = registro['pico_processo_mb'] - pico
+        _registros.append(registro)
+
+
+# Decorador: linhas de entrada = len do primeiro argumento, linhas de
+# saída = len do retorno (quando têm tamanho)
+def medir(nome: str):
+    def decorar(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with etapa(nome, _linhas(args[0]) if args else None) as registro:
+                resultado = funcao(*args, **kwargs)
+                registro['linhas_saida'] = _linhas(resultado)
+                return resultado
+        return medida
+    return decorar
+
+
+def registros() -> list:
+    return list(_registros)
+
+
+def limpar():
+    _registros.clear()
+
+
+def exportar_json() -> str:
+    return json.dumps(registros(), ensure_ascii=False, indent=2)
+
+
+# p50/p95 por etapa nos registros dados (padrão: todo o buffer)
+def resumo(lista: list = None) -> pd.DataFrame:
+    tabela = pd.DataFrame(registros() if lista is None else lista)
+    if tabela.empty:
+        return tabela
+    for coluna in ['linhas_entrada', 'linhas_saida']:
+        tabela[coluna] = pd.to_numeric(tabela[coluna])
+    agrupado = tabela.groupby('etapa')
+    return pd.DataFrame({
+        'execucoes': agrupado.size(),
+        'parede_p50_ms': agrupado['parede_ms'].quantile(0.5),
+        'parede_p95_ms': agrupado['parede_ms'].quantile(0.95),
+        'cpu_p50_ms': agrupado['cpu_ms'].quantile(0.5),
+        'cpu_p95_ms': agrupado['cpu_ms'].quantile(0.95),
+        'linhas_entrada_p50': agrupado['linhas_entrada'].median(),
+        'linhas_saida_p50': agrupado['linhas_saida'].median(),
+        'variacao_rss_p95_mb': agrupado['variacao_rss_mb'].quantile(0.95),
+        'aumento_pico_max_mb': agrupado['aumento_pico_mb'].max(),
+    }).sort_values('parede_p95_ms', ascending=False)
+
+
+# A página de diagnóstico fica fora do menu das páginas (continua acessível
+# pelo endereço /Diagnóstico)
+def ocultar_pagina_admin():
+    import streamlit as st
+
+    st.markdown(
+        '<style>[data-testid="stSidebarNav"] li:has(a[href*="Diagn"]) {display: none;}</style>',
+        unsafe_allow_html=True,
+    )
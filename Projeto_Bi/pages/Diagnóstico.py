@@ -0,0 +1,53 @@
+# Página de administração: tempo e memória por etapa do painel (buffer de
+# instrumentacao.py). Fica fora do menu; com token_admin definido no config
+# só abre com ?token=<valor> no endereço.
+import pandas as pd
+import streamlit as st
+
+from config import token_admin
+import instrumentacao
+
+st.set_page_config(
+    page_title="Diagnóstico",
+    page_icon=":stopwatch:",
+    layout="wide",
+)
+
+instrumentacao.ocultar_pagina_admin()
+
+if token_admin and st.query_params.get('token') != token_admin:
+    st.error('Acesso restrito.')
+    st.stop()
+
+st.title('Diagnóstico')
+
+registros = instrumentacao.registros()
+if not registros:
+    st.info('Nenhuma etapa medida ainda. Abra as páginas do painel e volte aqui.')
+    st.stop()
+
+# Janela dos registros mais recentes usada no resumo (o slider precisa de
+# pelo menos dois valores)
+janela = registros
+if len(registros) > 1:
+    ultimos = st.slider('Últimos registros', min_value=1, max_value=len(registros), value=len(registros))
+    janela = registros[-ultimos:]
+
+st.subheader('Tempo e memória por etapa')
+st.caption('Memória da etapa: variação do RSS durante ela (p95) e quanto o pico do processo subiu nela (máximo).')
+st.dataframe(instrumentacao.resumo(janela), column_config={
+    coluna: st.column_config.NumberColumn(format='%.1f')
+    for coluna in ['parede_p50_ms', 'parede_p95_ms', 'cpu_p50_ms', 'cpu_p95_ms', 'variacao_rss_p95_mb', 'aumento_pico_max_mb']
+})
+
+st.subheader('Registros recentes')
+st.dataframe(pd.DataFrame(janela[::-1]), hide_index=True)
+
+col1, col2 = st.columns(2)
+with col1:
+    st.download_button('Exportar JSON', instrumentacao.exportar_json(),
+                       file_name='instrumentacao.json', mime='application/json')
+with col2:
+    if st.button('Limpar registros'):
+        instrumentacao.limpar()
+        st.rerun()
@@ -5,6 +5,13 @@ import numpy as np
 import io
 import plotly.express as px
 from config import *
+from snapshot import carregar_snapshot
+import atualizador
+import instrumentacao
+from aging import classificar_aging
+from filtros import IndiceFiltros
+from esquema import COLUNAS_DATA
+from tabela import exibir_tabela, LinhasMemoria
 import plotly.graph_objects as go
 
 st.set_page_config(
@@ -13,120 +20,83 @@ st.set_page_config(
     layout="wide",
 )
 
+instrumentacao.ocultar_pagina_admin()
+
 st.title('Monitor Geração a Faturamento :truck:')
 
-def classify_aging(date):
-    aging_days = (pd.Timestamp.now() - date).days
-    if aging_days == 0:
-        return "24h"
-    elif 1 <= aging_days <= 2:
-        return "1 a 2 dias"
-    elif 3 <= aging_days <= 5:
-        return "3 a 5 dias"
-    elif 6 <= aging_days <= 10:
-        return "6 a 10 dias"
-    elif 11 <= aging_days <= 15:
-        return "11 a 15 dias"
-    elif 16 <= aging_days <= 20:
-        return "16 a 20 dias"
-    elif 21 <= aging_days <= 24:
-        return "21 a 24 dias"
-    elif 25 <= aging_days <= 30:
-        return "25 a 30 dias"
-    elif 31 <= aging_days <= 60:
-        return "31 a 60 dias"
-    elif aging_days > 60:
-        return "> 60 dias"
-    else:
-        return "> 30 dias"
-
-# Função que define o cliente com base no CNPJ
-def define_clientes_df(df_base: pd.DataFrame, clientes: list):
-    df_base['Pagador do frete/Documento'] = df_base['Pagador do frete/Documento'].fillna('').astype(str)
-    df_base['Cliente'] = ''
-    
-    for cliente in clientes:
-        df_base['Cliente'] = np.where(
-            df_base['Pagador do frete/Documento'].str.startswith(cliente['raiz_cnpj']),
-            cliente['nome'], df_base['Cliente']
-        )
-    
-    df_base['Cliente'] = np.where(
-        (
-            df_base['Cliente'].str.startswith('MULTI B2C')
-        ) & (
-            df_base['Frete/N° Referência'].str.contains('B2B', na=False)
-        ), 'MULTI B2B', df_base['Cliente']
-    )
-    
-    df_base['Cliente'] = np.where(df_base['Cliente'] == '', 'OUTROS', df_base['Cliente'])
-    
-    return df_base
-
-# Carregar dados em cache
-@st.cache_data
-def load_data():
-    return pd.read_excel('https://rpa.devinectar.com.br/scripts/pre_grade/relatorios_base/agendamento-2023-FULL_2024_10_29_14_52.xlsx')
-
-dados = load_data()
-
-# Definir clientes com base em CNPJ
-dados = define_clientes_df(dados, clientes)
-
-# Tratamento de datas
-date_columns = [
-    'Data do frete', 'Previsão Coleta', 'Data Finalização Performance', 
-    'Data Coleta', 'Data Última Tratativa', 'Data Última Ocorrência', 
-    'Previsão de Entrega'
-]
-for col in date_columns:
-    dados[col] = pd.to_datetime(dados[col], format='%d/%m/%Y', errors='coerce')
-
-# Adicionar coluna de aging
-dados['Aging'] = dados['Data do frete'].apply(classify_aging)
+# Carregar dados em cache (uma entrada por versão do snapshot). O DataFrame
+# é o do arquivo mapeado do snapshot, compartilhado entre as sessões (o
+# st.cache_data daria uma cópia a cada execução): a página não o altera
+@st.cache_resource(max_entries=1)
+def load_data(versao):
+    return carregar_snapshot(internas=False, versao=versao)
+
+# Índice dos filtros; o aging desta página muda com o dia, então o índice
+# é refeito por versão do snapshot e por dia
+@st.cache_resource(max_entries=1)
+def load_indice(versao, dia, _dados):
+    return IndiceFiltros(_dados, dimensoes=['Cliente', 'Aging'])
+
+# A atualização roda em segundo plano e já carrega os dados de cada versão
+# nova; cliente e datas já vêm tratados no snapshot
+atualizador.registrar_aquecimento('monitor', load_data)
+atualizador.iniciar()
+versao = atualizador.versao_publicada()
+dados = load_data(versao).copy(deep=False)
+
+# Adicionar coluna de aging (só na cópia rasa desta execução)
+with instrumentacao.etapa('monitor:aging', len(dados)):
+    dados['Aging'] = classificar_aging(dados['Data do frete'])
+indice = load_indice(versao, pd.Timestamp.now().date(), dados)
 
 # Sidebar com filtros
 st.sidebar.title('Filtros')
 
 # Opção para selecionar todos os clientes
-clientes_opcoes = ['Todos os Clientes'] + list(dados['Cliente'].unique())
+clientes_opcoes = ['Todos os Clientes'] + indice.valores('Cliente')
 embarcador_multi = st.sidebar.selectbox('Cliente', clientes_opcoes)
 
 ano_checkbox = st.sidebar.checkbox('Mostrar todos os anos', value=True)
-ano = '' if ano_checkbox else st.sidebar.selectbox('Ano', [2022, 2023, 2024])
+ano = '' if ano_checkbox else st.sidebar.selectbox('Ano', sorted(indice.valores('Ano')))
 
 meses = ['Todos os Meses', 'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 
          'Junho', 'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
 mes_selecionado = st.sidebar.selectbox('Mês', meses)
 
 # Filtro de Aging
-aging_opcoes = ['Todos'] + list(dados['Aging'].unique())
+aging_opcoes = ['Todos'] + indice.valores('Aging')
 aging_selecionado = st.sidebar.selectbox('Aging', aging_opcoes)
 
 # Filtrar os dados com base no cliente selecionado, ano (se aplicável) e aging
-dados_filtrados = dados.copy()
+selecao = {}
 
 if embarcador_multi != 'Todos os Clientes':
-    dados_filtrados = dados_filtrados[dados_filtrados['Cliente'] == embarcador_multi]
+    selecao['Cliente'] = embarcador_multi
 
 if mes_selecionado != 'Todos os Meses':
-    mes_numero = meses.index(mes_selecionado)  # Pega o índice que corresponde ao mês
-    dados_filtrados = dados_filtrados[dados_filtrados['Data do frete'].dt.month == mes_numero]
+    selecao['Mês'] = meses.index(mes_selecionado)  # Pega o índice que corresponde ao mês
 
 if ano:
-    dados_filtrados = dados_filtrados[dados_filtrados['Data do frete'].dt.year == ano]
+    selecao['Ano'] = ano
 
 if aging_selecionado != 'Todos':
-    dados_filtrados = dados_filtrados[dados_filtrados['Aging'] == aging_selecionado]
+    selecao['Aging'] = aging_selecionado
+
+posicoes = indice.filtrar(selecao)
+
+# Datas e valores já vêm tipados do snapshot; a formatação é só na exibição
+formato_colunas = {coluna: st.column_config.DateColumn(format='DD/MM/YYYY') for coluna in COLUNAS_DATA}
+formato_colunas['Nota Fiscal/Valor NF'] = st.column_config.NumberColumn(format='R$ %.2f')
+formato_colunas['N° Minuta'] = st.column_config.NumberColumn(format='%d')
 
 # Exibir as colunas disponíveis para seleção
 st.write("Colunas disponíveis:")
 columns = dados.columns.tolist()
 selected_columns = st.multiselect("Escolha as colunas para exibir", columns)
 
-# Exibir a tabela com as colunas selecionadas
+# Exibir a tabela com as colunas selecionadas (paginada: só a página vai para o navegador)
 if selected_columns:
     st.write("Dados do arquivo Excel (colunas selecionadas):")
-    st.dataframe(dados_filtrados[selected_columns])
+    exibir_tabela('monitor', LinhasMemoria(dados, selected_columns, posicoes), formato_colunas)
 else:
     st.write("Selecione pelo menos uma coluna para exibir.")
@@ -0,0 +1,165 @@
+# Relatório de agendamento sintético, para medir o painel sem o servidor do RPA.
+#
+# Mesmas colunas e formatos do relatório do RPA (datas dd/mm/aaaa em texto,
+# minuta como número da planilha, CNPJ só com dígitos), com ocorrências das
+# listas do config (e uma fração sem classificação), agentes das listas
+# regional_* e pagadores com as raízes de CNPJ de clientes. As linhas saem
+# em blocos e a semente é fixa: o mesmo tamanho gera sempre o mesmo
+# relatório, do 10k ao 5M, sem montar o relatório inteiro em memória. O
+# .xlsx para em 1.048.576 linhas; acima disso use .csv.
+#
+#     python sintetico.py 1M [--formato csv|xlsx] [--saida pasta] [--semente N]
+import argparse
+import os
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from classificacao import PRIORIDADE_DEGRADACAO, PRIORIDADE_REGIONAL
+from config import clientes
+from esquema import COLUNAS_DATA, FORMATO_DATA
+
+TAMANHOS = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000, '5M': 5_000_000}
+
+LINHAS_POR_BLOCO = 100_000
+LIMITE_XLSX = 1_048_575
+
+OCORRENCIAS = list(dict.fromkeys(o for _, lista in PRIORIDADE_DEGRADACAO for o in lista))
+OCORRENCIAS_NAO_MAPEADAS = ['Ocorrência Sintética Sem Classificação']
+AGENTES = list(dict.fromkeys(a for _, lista in PRIORIDADE_REGIONAL for a in lista))
+RAIZES = [cliente['raiz_cnpj'] for cliente in clientes]
+RAIZ_MULTI_B2C = next(cliente['raiz_cnpj'] for cliente in clientes if cliente['nome'] == 'MULTI B2C')
+
+# Frações das linhas com cada caso especial
+FRACAO_NAO_MAPEADA = 0.02
+FRACAO_OUTROS_PAGADORES = 0.10
+FRACAO_B2B = 0.30  # das linhas do MULTI B2C
+FRACAO_DATA_VAZIA = 0.05
+FRACAO_FRETE_REPETIDO = 0.05  # fretes com mais de uma NF
+
+DIAS_HISTORICO = 730
+
+
+def tamanho(texto: str) -> int:
+    return TAMANHOS[texto] if texto in TAMANHOS else int(texto)
+
+
+def _escolher(rng, opcoes: list, linhas: int) -> np.ndarray:
+    return np.asarray(opcoes, dtype=object)[rng.integers(0, len(opcoes), linhas)]
+
+
+# Datas em texto: o frete é sorteado em dias antes de hoje e as demais datas
+# em dias depois do frete; o texto de cada dia sai de uma tabela montada uma
+# vez por bloco, em vez de um strftime por linha
+def _datas(rng, frete: np.ndarray, textos: np.ndarray, dias_min: int, dias_max: int) -> np.ndarray:
+    dias = np.clip(frete + rng.integers(dias_min, dias_max + 1, len(frete)), 0, len(textos) - 1)
+    datas = textos[dias]
+    datas[rng.random(len(frete)) < FRACAO_DATA_VAZIA] = None
+    return datas
+
+
+# Linhas [inicio, inicio + linhas) do relatório; cada bloco tem o seu
+# gerador, derivado da semente e da posição
+def gerar_bloco(inicio: int, linhas: int, semente: int = 0, hoje: pd.Timestamp = None) -> pd.DataFrame:
+    rng = np.random.default_rng([semente, inicio])
+    hoje = (hoje or pd.Timestamp.now()).normalize()
+    # Dia 0 da tabela: DIAS_HISTORICO dias antes de hoje; as datas previstas
+    # podem passar de hoje em até 90 dias
+    textos = pd.date_range(hoje - pd.Timedelta(days=DIAS_HISTORICO), periods=DIAS_HISTORICO + 91).strftime(FORMATO_DATA)
+    textos = np.asarray(textos, dtype=object)
+
+    numero = np.arange(inicio, inicio + linhas)
+    repetidos = rng.random(linhas) < FRACAO_FRETE_REPETIDO
+    numero[repetidos & (numero > 0)] -= 1
+
+    raizes = _escolher(rng, RAIZES, linhas)
+    outros = rng.random(linhas) < FRACAO_OUTROS_PAGADORES
+    raizes[outros] = pd.Series(rng.integers(0, 10**8, outros.sum())).astype(str).str.zfill(8).to_numpy()
+    sufixos = pd.Series(rng.integers(0, 10**6, linhas)).astype(str).str.zfill(6)
+    documentos = (pd.Series(raizes) + sufixos).str[:14]
+
+    referencias = ('REF' + pd.Series(numero).astype(str).str.zfill(9)).to_numpy(dtype=object)
+    b2b = (raizes == RAIZ_MULTI_B2C) & (rng.random(linhas) < FRACAO_B2B)
+    referencias[b2b] += ' B2B'
+
+    ocorrencias = _escolher(rng, OCORRENCIAS, linhas)
+    nao_mapeadas = rng.random(linhas) < FRACAO_NAO_MAPEADA
+    ocorrencias[nao_mapeadas] = _escolher(rng, OCORRENCIAS_NAO_MAPEADAS, nao_mapeadas.sum())
+
+    frete = rng.integers(0, DIAS_HISTORICO + 1, linhas)
+    datas = {
+        'Data do frete': _datas(rng, frete, textos, 0, 0),
+        'Previsão Coleta': _datas(rng, frete, textos, 1, 10),
+        'Data Finalização Performance': _datas(rng, frete, textos, 5, 40),
+        'Data Coleta': _datas(rng, frete, textos, 1, 15),
+        'Data Checklist': _datas(rng, frete, textos, 0, 5),
+        'Data Última Tratativa': _datas(rng, frete, textos, 0, 60),
+        'Data Última Ocorrência': _datas(rng, frete, textos, 0, 90),
+        'Previsão de Entrega': _datas(rng, frete, textos, 5, 30),
+    }
+
+    return pd.DataFrame({
+        'N° Minuta': (1_000_000 + numero).astype('float64'),
+        'Frete/N° Referência': referencias,
+        'Pagador do frete/Documento': documentos.to_numpy(dtype=object),
+        **{coluna: datas[coluna] for coluna in COLUNAS_DATA},
+        'Última Ocorrência': ocorrencias,
+        'Agente de Coleta': _escolher(rng, AGENTES, linhas),
+        'Nota Fiscal/Valor NF': np.round(rng.lognormal(7, 1.2, linhas), 2),
+    })
+
+
+def gerar_blocos(linhas: int, semente: int = 0, linhas_por_bloco: int = LINHAS_POR_BLOCO):
+    hoje = pd.Timestamp.now()
+    for inicio in range(0, linhas, linhas_por_bloco):
+        yield gerar_bloco(inicio, min(linhas_por_bloco, linhas - inicio), semente, hoje)
+
+
+# O relatório inteiro em memória (para os tamanhos menores)
+def gerar(linhas: int, semente: int = 0) -> pd.DataFrame:
+    return pd.concat(gerar_blocos(linhas, semente), ignore_index=True)
+
+
+def gravar_csv(caminho: str, linhas: int, semente: int = 0):
+    for i, bloco in enumerate(gerar_blocos(linhas, semente)):
+        bloco.to_csv(caminho, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+
+def gravar_xlsx(caminho: str, linhas: int, semente: int = 0):
+    if linhas > LIMITE_XLSX:
+        raise ValueError(f'.xlsx comporta até {LIMITE_XLSX} linhas; use .csv')
+    livro = openpyxl.Workbook(write_only=True)
+    planilha = livro.create_sheet()
+    for i, bloco in enumerate(gerar_blocos(linhas, semente)):
+        if i == 0:
+            planilha.append(list(bloco.columns))
+        for linha in bloco.itertuples(index=False):
+            planilha.append([None if pd.isna(valor) else valor for valor in linha])
+    livro.save(caminho)
+
+
+# Nome no padrão dos relatórios do RPA, para servir a pasta como se fosse o
+# servidor ou passar o arquivo para o python -m etl
+def nome_arquivo(formato: str, momento: datetime = None) -> str:
+    return f"agendamento-2023-FULL_{(momento or datetime.now()).strftime('%Y_%m_%d_%H_%M')}.{formato}"
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(prog='python sintetico.py', description='Gera um relatório de agendamento sintético.')
+    parser.add_argument('linhas', help=f'número de linhas ou um de {", ".join(TAMANHOS)}')
+    parser.add_argument('--formato', choices=['csv', 'xlsx'], default='csv')
+    parser.add_argument('--saida', default=os.path.join('dados', 'sintetico'))
+    parser.add_argument('--semente', type=int, default=0)
+    args = parser.parse_args(argumentos)
+
+    os.makedirs(args.saida, exist_ok=True)
+    caminho = os.path.join(args.saida, nome_arquivo(args.formato))
+    gravar = gravar_csv if args.formato == 'csv' else gravar_xlsx
+    gravar(caminho, tamanho(args.linhas), args.semente)
+    print(caminho)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+# Acesso compartilhado ao relatório de agendamento.
+#
+# O Excel remoto é baixado e lido uma única vez por processo; o resultado é
+# gravado como snapshot Parquet local e todas as páginas passam a ler dele.
+# A ingestão grava o snapshot bloco a bloco; a representação compacta
+# (category, inteiros menores) é montada na leitura.
+#
+# Cada versão tem o seu arquivo e os metadados apontam para a vigente: uma
+# versão nova é gravada ao lado da atual e publicada trocando só os
+# metadados (os.replace), então quem ainda está lendo a anterior não é
+# afetado. A versão anterior é mantida até a próxima publicação.
+#
+# Junto com cada versão é gravada a forma que as páginas usam (sem colunas
+# internas, já compactada) num arquivo Arrow IPC sem compressão, que as
+# páginas abrem mapeado em memória: as colunas do DataFrame são visões do
+# arquivo, então todos os processos do Streamlit no mesmo host (e as duas
+# páginas de cada um) dividem uma única cópia do relatório, a do cache de
+# páginas do sistema operacional. Ele é montado a partir do Parquet uma
+# coluna por vez (gravar_arrow_do_parquet), sem o relatório inteiro na
+# memória de quem publica.
+#
+# Vários processos podem publicar na mesma pasta (réplicas do painel, o
+# `python atualizador.py`, o `python -m etl`): a publicação é feita com a
+# trava de arquivo da pasta (trava_publicacao), um processo por vez.
+import glob
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from config import dir_snapshot, colunas_descartadas
+from compactacao import compactar, TIPO_TEXTO
+from instrumentacao import etapa
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DIR_BASE = os.path.dirname(os.path.abspath(__file__))
+NOME_SNAPSHOT = 'agendamento-{versao}.parquet'
+NOME_CUBO = 'cubo-{versao}.parquet'
+NOME_ARROW = 'agendamento-{versao}.arrow'
+NOME_METADADOS = 'agendamento.json'
+NOME_TRAVA = 'agendamento.lock'
+
+
+# Arquivo de uma versão; sem versão, o da versão vigente
+def caminho_snapshot(versao: str = None):
+    if versao is None:
+        versao = versao_vigente()
+    return os.path.join(DIR_BASE, dir_snapshot, NOME_SNAPSHOT.format(versao=versao))
+
+
+# Cubo pré-agregado (cubo.montar_cubo) gravado junto com cada versão
+def caminho_cubo(versao: str):
+    return os.path.join(DIR_BASE, dir_snapshot, NOME_CUBO.format(versao=versao))
+
+
+# Forma das páginas, mapeada em memória (gravar_arrow)
+def caminho_arrow(versao: str):
+    return os.path.join(DIR_BASE, dir_snapshot, NOME_ARROW.format(versao=versao))
+
+
+def caminho_metadados():
+    return os.path.join(DIR_BASE, dir_snapshot, NOME_METADADOS)
+
+
+# Colunas object com tipos misturados (ex.: número e texto) não viram Arrow;
+# nesses casos a coluna é gravada como texto, preservando os nulos.
+def preparar_para_arrow(df: pd.DataFrame) -> pd.DataFrame:
+    for col in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[col] = df[col].astype(str).where(df[col].notna())
+    return df
+
+
+# Troca o arquivo de forma atômica, para que nenhum leitor veja um
+# snapshot pela metade
+def _substituir(caminho: str, gravar):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    gravar(temporario)
+    os.replace(temporario, caminho)
+
+
+# Trava exclusiva entre processos sobre o arquivo agendamento.lock da pasta;
+# espera até conseguir. O sistema operacional solta a trava se o processo
+# morrer com ela
+@contextmanager
+def trava_publicacao():
+    caminho = os.path.join(DIR_BASE, dir_snapshot, NOME_TRAVA)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'a+b') as arquivo:
+        if fcntl is not None:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX)
+        else:
+            arquivo.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(arquivo.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK desiste depois de ~10 s
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+            else:
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def gravar_snapshot(df: pd.DataFrame, caminho: str = None):
+    df = preparar_para_arrow(df)
+    _substituir(caminho or caminho_snapshot(), lambda tmp: df.to_parquet(tmp, index=False))
+
+
+# Os dicionários das colunas category mudam de um bloco para outro; no
+# arquivo todos usam índice int32 e valores texto
+def _esquema_blocos(esquema: pa.Schema) -> pa.Schema:
+    campos = []
+    for campo in esquema:
+        if pa.types.is_dictionary(campo.type):
+            campo = campo.with_type(pa.dictionary(pa.int32(), pa.string(), campo.type.ordered))
+        campos.append(campo)
+    return pa.schema(campos, metadata=esquema.metadata)
+
+
+# Grava um snapshot a partir de blocos com as mesmas colunas e tipos, sem
+# juntar os blocos em memória (cada bloco vira um row group)
+def gravar_snapshot_em_blocos(blocos, caminho: str = None):
+    def gravar(tmp):
+        escritor = None
+        try:
+            for bloco in blocos:
+                if escritor is None:
+                    esquema = _esquema_blocos(pa.Schema.from_pandas(bloco, preserve_index=False))
+                    escritor = pq.ParquetWriter(tmp, esquema)
+                escritor.write_table(pa.Table.from_pandas(bloco, schema=esquema, preserve_index=False))
+        finally:
+            if escritor is not None:
+                escritor.close()
+        if escritor is None:
+            raise ValueError('Relatório sem linhas')
+    _substituir(caminho or caminho_snapshot(), gravar)
+
+
+# Row groups de um snapshot, um por vez, como blocos da gravação
+def ler_blocos(caminho: str):
+    arquivo = pq.ParquetFile(caminho)
+    for grupo in range(arquivo.num_row_groups):
+        yield ler_grupo(arquivo, grupo)
+
+
+def ler_grupo(arquivo: pq.ParquetFile, grupo: int) -> pd.DataFrame:
+    with pd.option_context('mode.string_storage', 'pyarrow'):
+        return arquivo.read_row_group(grupo).to_pandas()
+
+
+def ler_metadados() -> dict:
+    try:
+        with open(caminho_metadados(), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def gravar_metadados(metadados: dict):
+    def gravar(tmp):
+        with open(tmp, 'w', encoding='utf-8') as arquivo:
+            json.dump(metadados, arquivo, ensure_ascii=False, indent=2)
+    _substituir(caminho_metadados(), gravar)
+
+
+def versao_vigente():
+    return ler_metadados().get('versao')
+
+
+def existe_snapshot() -> bool:
+    versao = versao_vigente()
+    return versao is not None and os.path.exists(caminho_snapshot(versao))
+
+
+# Apaga os arquivos de versões que não estão em `manter` (inclusive o
+# agendamento.parquet sem versão, de antes dos arquivos versionados). No
+# Windows um arquivo ainda aberto não pode ser apagado; fica para a próxima.
+def limpar_versoes(manter: list):
+    versoes = [versao for versao in manter if versao]
+    manter = {
+        caminho(versao) for versao in versoes for caminho in (caminho_snapshot, caminho_cubo, caminho_arrow)
+    }
+    pasta = os.path.join(DIR_BASE, dir_snapshot)
+    arquivos = ['agendamento*.parquet', 'cubo-*.parquet', 'agendamento-*.arrow']
+    for caminho in [caminho for padrao in arquivos for caminho in glob.glob(os.path.join(pasta, padrao))]:
+        if caminho not in manter:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+
+# As páginas não precisam das colunas internas (_chave, _hash), usadas só
+# na atualização. Colunas de texto voltam como string do Arrow e passam pela
+# compactação. Sem as internas, a versão é lida do arquivo Arrow mapeado,
+# se ela tiver um.
+def carregar_snapshot(internas: bool = True, versao: str = None) -> pd.DataFrame:
+    if versao is None:
+        versao = versao_vigente()
+    if not internas and os.path.exists(caminho_arrow(versao)):
+        return ler_arrow(caminho_arrow(versao))
+    return ler_snapshot(caminho_snapshot(versao), internas)
+
+
+def ler_snapshot(caminho: str, internas: bool = True) -> pd.DataFrame:
+    colunas = None
+    if not internas:
+        colunas = [nome for nome in pq.read_schema(caminho).names if not nome.startswith('_')]
+    with etapa('leitura_snapshot') as registro, pd.option_context('mode.string_storage', 'pyarrow'):
+        dados = compactar(pd.read_parquet(caminho, columns=colunas))
+        registro['linhas_saida'] = len(dados)
+        return dados
+
+
+# Cada coluna do pandas vira uma ou mais colunas Arrow de tipo primitivo e
+# sem nulos, que voltam para o pandas sem conversão: datas como int64 (NaT
+# incluído), category como os códigos (categorias nos metadados), inteiros
+# nullable como valores + máscara e números com o NaN como valor. Texto
+# fica como string do Arrow, que o pandas usa direto.
+def _colunas_arrow(serie: pd.Series) -> tuple:
+    tipo = serie.dtype
+    if isinstance(tipo, pd.CategoricalDtype):
+        descricao = {'tipo': 'categoria', 'categorias': tipo.categories.tolist(), 'ordenada': bool(tipo.ordered)}
+        return descricao, [serie.cat.codes.to_numpy()]
+    if isinstance(tipo, np.dtype) and tipo.kind == 'M':
+        return {'tipo': 'data', 'dtype': str(tipo)}, [serie.to_numpy().view('int64')]
+    if pd.api.types.is_extension_array_dtype(tipo) and pd.api.types.is_integer_dtype(tipo):
+        valores = serie.to_numpy(dtype=tipo.numpy_dtype, na_value=0)
+        return {'tipo': 'inteiro', 'dtype': str(tipo)}, [valores, serie.isna().to_numpy().view('uint8')]
+    if isinstance(tipo, np.dtype) and tipo.kind in 'biuf':
+        return {'tipo': 'numero'}, [serie.to_numpy()]
+    return {'tipo': 'arrow'}, [pa.array(serie, from_pandas=True)]
+
+
+def _coluna_pandas(descricao: dict, partes: list):
+    if descricao['tipo'] == 'arrow':
+        return partes[0].to_pandas(types_mapper={pa.string(): TIPO_TEXTO, pa.large_string(): TIPO_TEXTO}.get).array
+    valores = partes[0].to_numpy(zero_copy_only=True)
+    if descricao['tipo'] == 'categoria':
+        tipo = pd.CategoricalDtype(descricao['categorias'], descricao['ordenada'])
+        return pd.Categorical.from_codes(valores, dtype=tipo, validate=False)
+    if descricao['tipo'] == 'data':
+        return valores.view(descricao['dtype'])
+    if descricao['tipo'] == 'inteiro':
+        return pd.arrays.IntegerArray(valores, partes[1].to_numpy(zero_copy_only=True).view(bool))
+    return valores
+
+
+# Descrições e arrays (um chunk cada) das colunas de `df`
+def _partes_arrow(df: pd.DataFrame) -> tuple:
+    descricoes, arrays = [], []
+    for coluna in df.columns:
+        descricao, partes = _colunas_arrow(df[coluna])
+        descricoes.append({**descricao, 'nome': coluna, 'partes': len(partes)})
+        for parte in partes:
+            parte = pa.array(parte) if isinstance(parte, np.ndarray) else parte
+            arrays.append(parte.combine_chunks() if isinstance(parte, pa.ChunkedArray) else parte)
+    return descricoes, arrays
+
+
+# Um único record batch: cada coluna é um bloco contíguo no arquivo
+def _gravar_ipc(descricoes: list, arrays: list, caminho: str):
+    nomes = [f'{i}.{j}' for i, descricao in enumerate(descricoes) for j in range(descricao['partes'])]
+    tabela = pa.Table.from_arrays(arrays, names=nomes, metadata={'colunas': json.dumps(descricoes, ensure_ascii=False)})
+
+    def gravar(tmp):
+        with ipc.new_file(tmp, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    _substituir(caminho, gravar)
+
+
+def gravar_arrow(df: pd.DataFrame, caminho: str):
+    _gravar_ipc(*_partes_arrow(df), caminho)
+
+
+# O mesmo arquivo de gravar_arrow, a partir do Parquet de uma versão: cada
+# coluna é lida, compactada e gravada num arquivo temporário, e o arquivo
+# final junta as colunas já mapeadas em memória. Só uma coluna do relatório
+# fica na memória do processo por vez.
+def gravar_arrow_do_parquet(caminho_parquet: str, caminho: str):
+    nomes = [
+        nome for nome in pq.read_schema(caminho_parquet).names
+        if not nome.startswith('_') and nome not in colunas_descartadas
+    ]
+    with etapa('arrow') as registro, tempfile.TemporaryDirectory(dir=os.path.dirname(caminho)) as pasta:
+        descricoes, arrays, mapas = [], [], []
+        for nome in nomes:
+            with pd.option_context('mode.string_storage', 'pyarrow'):
+                coluna = compactar(pd.read_parquet(caminho_parquet, columns=[nome]))
+            registro['linhas_saida'] = len(coluna)
+            temporario = os.path.join(pasta, f'{len(mapas)}.arrow')
+            _gravar_ipc(*_partes_arrow(coluna), temporario)
+            del coluna
+            mapas.append(pa.memory_map(temporario))
+            tabela = ipc.open_file(mapas[-1]).read_all()
+            descricao = json.loads(tabela.schema.metadata[b'colunas'])
+            descricoes += descricao
+            arrays += [tabela.column(i).chunk(0) for i in range(tabela.num_columns)]
+        _gravar_ipc(descricoes, arrays, caminho)
+        # No Windows os temporários só saem da pasta depois de desmapeados
+        del tabela, arrays
+        for mapa in mapas:
+            mapa.close()
+
+
+# As colunas devolvidas são visões somente leitura do arquivo mapeado; o
+# DataFrame é montado sem juntar as colunas em blocos (copy=False)
+def ler_arrow(caminho: str) -> pd.DataFrame:
+    with etapa('leitura_snapshot') as registro:
+        with pa.memory_map(caminho) as arquivo:
+            tabela = ipc.open_file(arquivo).read_all()
+        colunas, i = {}, 0
+        for descricao in json.loads(tabela.schema.metadata[b'colunas']):
+            partes = [tabela.column(i + j).chunk(0) for j in range(descricao['partes'])]
+            colunas[descricao['nome']] = _coluna_pandas(descricao, partes)
+            i += descricao['partes']
+        dados = pd.DataFrame(colunas, copy=False)
+        registro['linhas_saida'] = len(dados)
+        return dados
+
+
+def gravar_cubo(celulas: pd.DataFrame, versao: str):
+    _substituir(caminho_cubo(versao), lambda tmp: celulas.to_parquet(tmp, index=False))
+
+
+# None se a versão não tem cubo gravado (as páginas montam o cubo na hora)
+def carregar_cubo(versao: str):
+    try:
+        return pd.read_parquet(caminho_cubo(versao))
+    except FileNotFoundError:
+        return None
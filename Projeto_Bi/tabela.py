@@ -0,0 +1,121 @@
+# Tabela paginada das páginas.
+#
+# A tabela nunca vai inteira para o navegador: ordenação, colunas e recorte
+# da página são aplicados aqui e só as linhas visíveis são serializadas pelo
+# st.dataframe. As linhas vêm de uma origem com total() e pagina():
+# LinhasMemoria recorta o snapshot pelas posições do índice de filtros (o
+# total é o número de posições, sem montar o DataFrame filtrado) e
+# LinhasBanco pede ao MariaDB (ou ao DuckDB) só a página (LIMIT/OFFSET) e o
+# COUNT.
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import banco
+from instrumentacao import etapa
+
+TAMANHOS_PAGINA = [50, 100, 500, 1000]
+SEM_ORDEM = '(ordem do relatório)'
+
+
+class LinhasMemoria:
+    # posicoes: linhas do resultado, em ordem crescente (None = todas)
+    def __init__(self, dados: pd.DataFrame, colunas: list, posicoes: np.ndarray = None):
+        self.dados = dados
+        self.colunas = colunas
+        self.posicoes = None if posicoes is not None and len(posicoes) == len(dados) else posicoes
+
+    def total(self) -> int:
+        return len(self.dados) if self.posicoes is None else len(self.posicoes)
+
+    # Posições na ordem da coluna; só ela é lida para todas as linhas
+    def ordenar(self, ordem: str, crescente: bool = True) -> np.ndarray:
+        valores = self.dados[ordem] if self.posicoes is None else self.dados[ordem].take(self.posicoes)
+        ordenadas = valores.reset_index(drop=True).sort_values(
+            ascending=crescente, kind='stable', na_position='last'
+        ).index.to_numpy()
+        return ordenadas if self.posicoes is None else self.posicoes[ordenadas]
+
+    # ordenadas: o resultado de ordenar() já guardado, se houver. As linhas
+    # da página são recortadas antes de escolher as colunas, para não copiar
+    # as colunas pedidas inteiras
+    def pagina(self, inicio: int, tamanho: int, ordem: str = None, crescente: bool = True,
+               ordenadas: np.ndarray = None) -> pd.DataFrame:
+        posicoes = self.posicoes
+        if ordem is not None:
+            posicoes = ordenadas if ordenadas is not None else self.ordenar(ordem, crescente)
+        if posicoes is None:
+            return self.dados.iloc[inicio:inicio + tamanho][self.colunas]
+        return self.dados.take(posicoes[inicio:inicio + tamanho])[self.colunas]
+
+
+class LinhasBanco:
+    # consultas: o módulo banco ou uma consultas.Consultas
+    def __init__(self, selecao: dict, colunas: list, distintas: bool = False, consultas=banco):
+        self.selecao = selecao
+        self.colunas = colunas
+        self.distintas = distintas
+        self.consultas = consultas
+        self._total = None
+
+    def total(self) -> int:
+        if self._total is None:
+            self._total = self.consultas.contar(self.selecao, self.colunas, self.distintas)
+        return self._total
+
+    # A ordenação é feita no banco, junto com o LIMIT
+    def pagina(self, inicio: int, tamanho: int, ordem: str = None, crescente: bool = True,
+               ordenadas: np.ndarray = None) -> pd.DataFrame:
+        linhas = self.consultas.linhas(
+            self.selecao, self.colunas, self.distintas,
+            limite=tamanho, deslocamento=inicio, ordem=ordem, crescente=crescente,
+        )
+        return linhas.set_axis(pd.RangeIndex(inicio, inicio + len(linhas)))
+
+
+# Controles (ordenação, linhas por página, página) + a página da tabela.
+# chave separa o estado dos controles de cada tabela da página. memo(chave,
+# calcular), se passado, guarda a ordenação das linhas em memória (por
+# exemplo no cache de resultados da seleção) para a troca de página não
+# ordenar de novo
+def exibir_tabela(chave: str, linhas, column_config: dict = None, memo=None):
+    with etapa(f'tabela:{chave}') as registro:
+        total = linhas.total()
+        registro['linhas_entrada'] = total
+        registro['linhas_saida'] = _exibir_pagina(chave, linhas, total, column_config, memo)
+
+
+def _exibir_pagina(chave: str, linhas, total: int, column_config: dict, memo) -> int:
+    col_ordem, col_sentido, col_tamanho, col_pagina = st.columns([3, 2, 2, 2])
+    with col_ordem:
+        ordem = st.selectbox('Ordenar por', [SEM_ORDEM] + list(linhas.colunas), key=f'{chave}_ordem')
+    with col_sentido:
+        sentido = st.selectbox('Ordem', ['Crescente', 'Decrescente'], key=f'{chave}_sentido',
+                               disabled=ordem == SEM_ORDEM)
+    with col_tamanho:
+        tamanho = st.selectbox('Linhas por página', TAMANHOS_PAGINA, key=f'{chave}_tamanho')
+
+    paginas = max(1, math.ceil(total / tamanho))
+    # Com outro filtro ou tamanho de página a página guardada pode não existir mais
+    if st.session_state.get(f'{chave}_pagina', 1) > paginas:
+        st.session_state[f'{chave}_pagina'] = paginas
+    with col_pagina:
+        pagina = st.number_input(f'Página (de {paginas})', min_value=1, max_value=paginas, step=1,
+                                 key=f'{chave}_pagina')
+
+    inicio = (pagina - 1) * tamanho
+    ordem = None if ordem == SEM_ORDEM else ordem
+    crescente = sentido == 'Crescente'
+    ordenadas = None
+    if memo is not None and ordem is not None and isinstance(linhas, LinhasMemoria):
+        ordenadas = memo((chave, ordem, crescente), lambda: linhas.ordenar(ordem, crescente))
+    dados = linhas.pagina(inicio, tamanho, ordem=ordem, crescente=crescente, ordenadas=ordenadas)
+
+    st.dataframe(dados, column_config=column_config)
+    if total:
+        st.caption(f'Linhas {inicio + 1:,} a {inicio + len(dados):,} de {total:,}'.replace(',', '.'))
+    else:
+        st.caption('Nenhuma linha.')
+    return len(dados)
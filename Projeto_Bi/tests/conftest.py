@@ -0,0 +1,10 @@
+# Os módulos do painel ficam na raiz do Projeto_Bi (sem pacote)
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Snapshot, histórico e saídas do ETL dos testes numa pasta temporária (o
+# config lê a variável na importação)
+os.environ.setdefault('DASHBOARD_DIR_SNAPSHOT', tempfile.mkdtemp(prefix='snapshot-testes-'))
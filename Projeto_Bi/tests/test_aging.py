@@ -0,0 +1,54 @@
+# Paridade de aging.classificar_aging com o classify_aging linha a linha que
+# as páginas usavam antes, em todos os dias de fronteira das faixas.
+import pandas as pd
+import pytest
+
+from aging import classificar_aging
+
+
+# classify_aging original, com o "agora" fixo em vez de pd.Timestamp.now()
+def classify_aging(date, agora):
+    aging_days = (agora - date).days
+    if aging_days == 0:
+        return "24h"
+    elif 1 <= aging_days <= 2:
+        return "1 a 2 dias"
+    elif 3 <= aging_days <= 5:
+        return "3 a 5 dias"
+    elif 6 <= aging_days <= 10:
+        return "6 a 10 dias"
+    elif 11 <= aging_days <= 15:
+        return "11 a 15 dias"
+    elif 16 <= aging_days <= 20:
+        return "16 a 20 dias"
+    elif 21 <= aging_days <= 24:
+        return "21 a 24 dias"
+    elif 25 <= aging_days <= 30:
+        return "25 a 30 dias"
+    elif 31 <= aging_days <= 60:
+        return "31 a 60 dias"
+    elif aging_days > 60:
+        return "> 60 dias"
+    else:
+        return "> 30 dias"
+
+
+@pytest.mark.parametrize('agora', [
+    pd.Timestamp('2024-10-29 00:00:00'),
+    pd.Timestamp('2024-10-29 00:00:01'),
+    pd.Timestamp('2024-10-29 09:30:00'),
+    pd.Timestamp('2024-10-29 14:52:37.123456'),
+    pd.Timestamp('2024-10-29 23:59:59.999999'),
+])
+def test_paridade_com_classify_aging(agora):
+    # Datas sem hora (como vêm do relatório) e com hora, de -3 a 75 dias, e vazias
+    datas = []
+    for dias in range(-3, 76):
+        dia = agora.normalize() - pd.Timedelta(days=dias)
+        datas += [dia, dia + pd.Timedelta(hours=12), dia + pd.Timedelta(hours=23, minutes=59)]
+    datas = pd.Series(datas + [pd.NaT, pd.NaT], dtype='datetime64[ns]')
+
+    esperado = datas.apply(classify_aging, agora=agora)
+    obtido = classificar_aging(datas, agora)
+
+    pd.testing.assert_series_equal(obtido.astype(str), esperado.astype(str), check_names=False)
@@ -0,0 +1,67 @@
+# Publicação do `python -m etl --publicar`: o mesmo frete em mais de um
+# relatório vale o do último, e a verificação do servidor do RPA não
+# substitui a versão publicada.
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import atualizacao
+import etl
+import ingestao
+import sintetico
+import snapshot
+
+
+def _publicar(pasta, *relatorios):
+    etl.main([str(relatorio) for relatorio in relatorios] + ['--processos', '1', '--saida', str(pasta), '--publicar'])
+    return snapshot.ler_metadados()
+
+
+def _gravar(caminho, dados):
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    dados.to_csv(caminho, index=False)
+    return caminho
+
+
+# Frete com duas NFs no relatório antigo e uma no novo: fica só a do novo.
+# Os dois relatórios têm o mesmo nome, em pastas diferentes.
+def test_frete_do_relatorio_mais_novo_substitui_todas_as_linhas(tmp_path):
+    base = sintetico.gerar(50, semente=1)
+    frete = base.iloc[[10]]
+    antigo = pd.concat([base, frete.assign(**{'Nota Fiscal/Valor NF': 1.0})], ignore_index=True)
+    novo = frete.assign(**{'Última Ocorrência': 'Produto Coletado'})
+
+    _publicar(
+        tmp_path / 'etl',
+        _gravar(tmp_path / 'antigo' / 'relatorio.csv', antigo),
+        _gravar(tmp_path / 'novo' / 'relatorio.csv', novo),
+    )
+
+    dados = snapshot.carregar_snapshot(internas=False)
+    minuta = int(frete['N° Minuta'].iloc[0])
+    linhas = dados[dados['N° Minuta'] == minuta]
+    assert len(linhas) == 1
+    assert linhas['Última Ocorrência'].iloc[0] == 'Produto Coletado'
+    assert len(dados) == len(base) - (base['N° Minuta'] == minuta).sum() + 1
+
+
+def test_verificacao_do_rpa_mantem_a_versao_do_etl(tmp_path, monkeypatch):
+    publicado = _publicar(
+        tmp_path / 'etl',
+        _gravar(tmp_path / 'um.csv', sintetico.gerar(300, semente=1)),
+        _gravar(tmp_path / 'dois.csv', sintetico.gerar(200, semente=2).assign(**{'N° Minuta': lambda df: df['N° Minuta'] + 10**6})),
+    )
+    linhas = len(snapshot.carregar_snapshot(internas=False))
+    assert publicado['origem'] == atualizacao.ORIGEM_ETL
+
+    # O servidor do RPA tem outro relatório, menor
+    rpa = _gravar(tmp_path / 'rpa.csv', sintetico.gerar(100, semente=3))
+    monkeypatch.setattr(atualizacao, 'localizar_relatorio_mais_recente',
+                        lambda: 'http://rpa/agendamento-2023-FULL_2026_10_10_00_00.csv')
+    monkeypatch.setattr(atualizacao, 'consultar_cabecalhos', lambda url: {})
+    monkeypatch.setattr(ingestao, 'baixar_para_arquivo', lambda url: (open(rpa, 'rb'), 'sha256-rpa'))
+    # Já passou intervalo_verificacao_min desde a publicação
+    snapshot.gravar_metadados({**publicado, 'verificado_em': (datetime.now() - timedelta(hours=1)).isoformat()})
+
+    assert atualizacao.garantir_snapshot() == publicado['versao']
+    assert len(snapshot.carregar_snapshot(internas=False)) == linhas
@@ -0,0 +1,39 @@
+# Transformações do relatório de agendamento compartilhadas pelas páginas
+# (cliente, datas, aging, degradação e regional).
+import pandas as pd
+
+from aging import classificar_aging
+from classificacao import classificar_clientes, classificar_degradacao, classificar_regional
+from config import clientes
+from esquema import aplicar_esquema
+from instrumentacao import etapa, medir
+
+# Função que define o cliente com base no CNPJ
+@medir('clientes')
+def define_clientes_df(df_base: pd.DataFrame, clientes: list):
+    df_base['Pagador do frete/Documento'] = df_base['Pagador do frete/Documento'].fillna('').astype(str)
+    df_base['Cliente'] = classificar_clientes(
+        df_base['Pagador do frete/Documento'], df_base['Frete/N° Referência'], clientes
+    )
+    return df_base
+
+
+# Aging depende do dia de hoje, por isso pode ser recalculado sozinho
+@medir('aging')
+def calcular_aging(df: pd.DataFrame, agora: pd.Timestamp = None):
+    df['Aging'] = classificar_aging(df['Data Última Ocorrência'], agora)
+    return df
+
+
+# Aplica todas as colunas derivadas sobre linhas brutas do relatório
+@medir('derivadas')
+def aplicar_derivadas(df: pd.DataFrame):
+    with etapa('esquema', len(df)):
+        df = aplicar_esquema(df)
+    df = define_clientes_df(df, clientes)
+    df = calcular_aging(df)
+    with etapa('degradacao', len(df)):
+        df['Degradação'] = classificar_degradacao(df['Última Ocorrência'])
+    with etapa('regional', len(df)):
+        df['Regional'] = classificar_regional(df['Agente de Coleta'])
+    return df